@@ -1,7 +1,7 @@
 {
     "name": "Product Excel Import Advanced",
     "summary": "Import product data from Excel with SKU match, image, and logs",
-    "version": "1.0",
+    "version": "1.3",
     "depends": ["base", "product","stock"],
     "author": "Steve Liu",
     "category": "Product",
@@ -9,8 +9,17 @@
         "security/ir.model.access.csv",
         "views/product_import_wizard_view.xml",
         "views/product_import_log_view.xml",
+        "views/product_import_job_view.xml",
+        "views/product_image_blob_view.xml",
         "data/product_image_cron.xml",
+        "data/product_import_job_cron.xml",
+        "data/product_import_file_cron.xml",
     ],
+    "assets": {
+        "web.assets_backend": [
+            "product_excel_import_advanced/static/src/js/import_job_progress.js",
+        ],
+    },
     "installable": True,
     "application": True,
 }
@@ -0,0 +1,20 @@
+import logging
+
+from odoo import api, SUPERUSER_ID
+
+_logger = logging.getLogger(__name__)
+
+
+def migrate(cr, version):
+    """ 导入日志与任务不再各自保存上传的文件：将旧附件按内容合并到 product.import.file 后删除 """
+    env = api.Environment(cr, SUPERUSER_ID, {})
+    ImportFile = env['product.import.file']
+    for model_name, field_name, filename_field in (('product.import.log', 'import_file', 'name'), ('product.import.job', 'file', 'filename')):
+        attachments = env['ir.attachment'].search([('res_model', '=', model_name), ('res_field', '=', field_name)])
+        for attachment in attachments:
+            record = env[model_name].browse(attachment.res_id).exists()
+            if record and attachment.raw:
+                import_file = ImportFile._get_or_create(attachment.raw, record[filename_field])
+                record.import_file_id = import_file
+        _logger.info(f"Moved {len(attachments)} {model_name} file attachments to product.import.file")
+        attachments.unlink()
@@ -0,0 +1,23 @@
+import logging
+
+_logger = logging.getLogger(__name__)
+
+
+def migrate(cr, version):
+    """ 初始化 image_pending：有可下载的图片 URL、还没有图片且未标记失败的产品加入下载队列 """
+    cr.execute("""
+        UPDATE product_template t
+           SET image_pending = TRUE
+         WHERE t.image_url LIKE 'http%%'
+           AND t.image_url NOT LIKE '%%localhost%%'
+           AND t.image_url NOT LIKE '%%127.0.0.1%%'
+           AND NOT COALESCE(t.image_download_failed, FALSE)
+           AND NOT EXISTS (
+               SELECT 1
+                 FROM ir_attachment a
+                WHERE a.res_model = 'product.template'
+                  AND a.res_field = 'image_1920'
+                  AND a.res_id = t.id
+           )
+    """)
+    _logger.info(f"Queued {cr.rowcount} product templates for image download")
@@ -0,0 +1,21 @@
+import logging
+
+_logger = logging.getLogger(__name__)
+
+
+def migrate(cr, version):
+    """ 导入指纹从产品模板移到变体：只有一个变体的模板的指纹可以确定属于哪个 SKU，直接迁移；
+    多变体模板的指纹无法对应到具体 SKU，丢弃后下次导入会重新写入这些产品 """
+    cr.execute("SELECT 1 FROM information_schema.columns WHERE table_name = 'product_template' AND column_name = 'import_fingerprint'")
+    if not cr.fetchone():
+        return
+    cr.execute("""
+        UPDATE product_product p
+           SET import_fingerprint = t.import_fingerprint
+          FROM product_template t
+         WHERE t.id = p.product_tmpl_id
+           AND t.import_fingerprint IS NOT NULL
+           AND (SELECT COUNT(*) FROM product_product v WHERE v.product_tmpl_id = t.id) = 1
+    """)
+    _logger.info(f"Moved {cr.rowcount} import fingerprints from product templates to variants")
+    cr.execute("ALTER TABLE product_template DROP COLUMN import_fingerprint")
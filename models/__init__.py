@@ -1,3 +1,7 @@
 from . import product_import_wizard
 from . import product_import_log
+from . import product_import_file
+from . import product_image_store
 from . import product_template_image_url
+from . import product_template_import
+from . import product_import_job
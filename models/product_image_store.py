@@ -0,0 +1,175 @@
+import base64
+import hashlib
+import logging
+from datetime import timedelta
+from urllib.parse import urlparse
+
+from odoo import api, models, fields
+
+_logger = logging.getLogger(__name__)
+
+# 下载失败的 URL 按指数退避重试：10 分钟、20 分钟、40 分钟……最长 7 天
+RETRY_BASE_MINUTES = 10
+RETRY_MAX_MINUTES = 7 * 24 * 60
+# 同一域名连续失败（无响应、429、5xx）达到该次数后熔断，暂停访问该域名
+HOST_FAILURE_THRESHOLD = 5
+# 熔断时长：5 分钟起，之后每次继续失败加倍，最长 6 小时
+HOST_COOLDOWN_MINUTES = 5
+HOST_COOLDOWN_MAX_MINUTES = 6 * 60
+
+
+def _backoff(base_minutes, max_minutes, exponent):
+    return timedelta(minutes=min(base_minutes * 2 ** min(exponent, 20), max_minutes))
+
+
+class ProductImageBlob(models.Model):
+    _name = 'product.image.blob'
+    _description = 'Product Image Content'
+    _rec_name = 'checksum'
+
+    checksum = fields.Char("Checksum", required=True, index=True, readonly=True, help="SHA-1 of the image content.")
+    image = fields.Binary("Image", attachment=True, readonly=True)
+    file_size = fields.Integer("Size (bytes)", readonly=True, help="Size of the stored (processed) image.")
+    original_size = fields.Integer("Original Size (bytes)", readonly=True, help="Size of the downloaded image before resizing and re-encoding.")
+    source_ids = fields.One2many('product.image.source', 'blob_id', string="Source URLs", readonly=True)
+
+    _sql_constraints = [
+        ('checksum_uniq', 'unique(checksum)', 'An image with the same content is already stored.'),
+    ]
+
+    @api.model
+    def _get_or_create(self, content, original_size=None):
+        """ 按内容哈希查找图片，不存在时创建。相同内容只保存一份 """
+        checksum = hashlib.sha1(content).hexdigest()
+        blob = self.search([('checksum', '=', checksum)], limit=1)
+        if not blob:
+            blob = self.create({
+                'checksum': checksum,
+                'image': base64.b64encode(content),
+                'file_size': len(content),
+                'original_size': original_size or len(content),
+            })
+        return blob
+
+    def _get_content(self):
+        self.ensure_one()
+        return base64.b64decode(self.image) if self.image else b''
+
+
+class ProductImageSource(models.Model):
+    _name = 'product.image.source'
+    _description = 'Product Image Source URL'
+    _rec_name = 'url'
+
+    url = fields.Char("URL", required=True, index=True, readonly=True)
+    host = fields.Char("Host", index=True, readonly=True)
+    blob_id = fields.Many2one('product.image.blob', string="Image Content", index=True, readonly=True, ondelete='set null')
+    checksum = fields.Char(related='blob_id.checksum', string="Checksum")
+    date_fetched = fields.Datetime("Fetched At", readonly=True, help="Last time new content was downloaded.")
+    date_checked = fields.Datetime("Checked At", readonly=True, index=True, help="Last time the URL was fetched or revalidated successfully.")
+    etag = fields.Char("ETag", readonly=True)
+    last_modified = fields.Char("Last-Modified", readonly=True)
+    last_status = fields.Integer("Last HTTP Status", readonly=True, help="0 when the last request failed without an HTTP response.")
+    last_error = fields.Char("Last Error", readonly=True)
+    fail_count = fields.Integer("Consecutive Failures", readonly=True)
+    next_retry_at = fields.Datetime("Next Retry", readonly=True, index=True, help="The URL is not requested again before this time.")
+
+    _sql_constraints = [
+        ('url_uniq', 'unique(url)', 'The image URL is already indexed.'),
+    ]
+
+    @api.model
+    def _get_by_url(self, urls):
+        """ 一次查询返回 {url: source}，包含已下载过的 URL 与失败后等待重试的 URL """
+        return {source.url: source for source in self.search([('url', 'in', list(urls))])}
+
+    @api.model
+    def _upsert(self, url, vals):
+        source = self.search([('url', '=', url)], limit=1)
+        if source:
+            source.write(vals)
+        else:
+            source = self.create(dict(vals, url=url, host=urlparse(url).netloc.lower()))
+        return source
+
+    @api.model
+    def _register_content(self, url, content, original_size=None, etag=None, last_modified=None):
+        """ 记录 URL 对应的图片内容（已处理）与缓存校验头，清除失败状态，返回 blob """
+        blob = self.env['product.image.blob']._get_or_create(content, original_size)
+        now = fields.Datetime.now()
+        self._upsert(url, {
+            'blob_id': blob.id,
+            'date_fetched': now,
+            'date_checked': now,
+            'etag': etag,
+            'last_modified': last_modified,
+            'last_status': 200,
+            'last_error': False,
+            'fail_count': 0,
+            'next_retry_at': False,
+        })
+        return blob
+
+    def _register_not_modified(self):
+        """ 条件请求返回 304：图片未变化，只更新检查时间 """
+        self.write({
+            'date_checked': fields.Datetime.now(),
+            'last_status': 304,
+            'last_error': False,
+            'fail_count': 0,
+            'next_retry_at': False,
+        })
+
+    @api.model
+    def _register_failure(self, url, status, error):
+        """ 记录下载失败，按连续失败次数指数退避计算下次重试时间 """
+        source = self.search([('url', '=', url)], limit=1)
+        fail_count = source.fail_count + 1
+        retry_delay = _backoff(RETRY_BASE_MINUTES, RETRY_MAX_MINUTES, fail_count - 1)
+        source = self._upsert(url, {
+            'last_status': status,
+            'last_error': (error or '')[:255],
+            'fail_count': fail_count,
+            'next_retry_at': fields.Datetime.now() + retry_delay,
+        })
+        _logger.info(f"Image URL {url} failed {fail_count} time(s) in a row, next retry in {retry_delay}")
+        return source
+
+
+class ProductImageHost(models.Model):
+    _name = 'product.image.host'
+    _description = 'Product Image Host'
+
+    name = fields.Char("Host", required=True, index=True, readonly=True)
+    fail_count = fields.Integer("Consecutive Failures", readonly=True)
+    circuit_open_until = fields.Datetime("Paused Until", readonly=True, help="Images from this host are not requested before this time.")
+    last_error = fields.Char("Last Error", readonly=True)
+
+    _sql_constraints = [
+        ('name_uniq', 'unique(name)', 'The image host already exists.'),
+    ]
+
+    @api.model
+    def _get_failing(self):
+        """ 返回有连续失败记录的域名 {host: record} """
+        return {host.name: host for host in self.search([('fail_count', '>', 0)])}
+
+    def _is_open(self):
+        """ 熔断中（暂停访问）返回 True """
+        return bool(self.circuit_open_until and self.circuit_open_until > fields.Datetime.now())
+
+    @api.model
+    def _register_failure(self, name, error, host=None):
+        """ 记录域名的一次失败，连续失败达到阈值后熔断，返回域名记录 """
+        host = host or self.search([('name', '=', name)], limit=1) or self.create({'name': name})
+        fail_count = host.fail_count + 1
+        vals = {'fail_count': fail_count, 'last_error': (error or '')[:255]}
+        if fail_count >= HOST_FAILURE_THRESHOLD:
+            cooldown = _backoff(HOST_COOLDOWN_MINUTES, HOST_COOLDOWN_MAX_MINUTES, fail_count - HOST_FAILURE_THRESHOLD)
+            vals['circuit_open_until'] = fields.Datetime.now() + cooldown
+            _logger.warning(f"Image host {name} failed {fail_count} times in a row, pausing downloads for {cooldown}")
+        host.write(vals)
+        return host
+
+    def _register_success(self):
+        self.write({'fail_count': 0, 'circuit_open_until': False, 'last_error': False})
@@ -0,0 +1,89 @@
+import base64
+import hashlib
+import logging
+import os
+from datetime import timedelta
+
+from odoo import api, models, fields
+
+_logger = logging.getLogger(__name__)
+
+# 导入文件的默认保留天数（最后一次上传之后），可通过系统参数调整
+IMPORT_FILE_RETENTION_DAYS = 90
+
+
+class ProductImportFile(models.Model):
+    _name = 'product.import.file'
+    _description = 'Product Import File'
+    _rec_name = 'filename'
+    _order = 'date_last_uploaded desc'
+
+    checksum = fields.Char("Checksum", required=True, index=True, readonly=True, help="SHA-1 of the file content.")
+    file = fields.Binary("File", attachment=True, readonly=True)
+    filename = fields.Char("Filename", readonly=True)
+    file_size = fields.Integer("Size (bytes)", readonly=True)
+    upload_count = fields.Integer("Uploads", default=1, readonly=True)
+    date_last_uploaded = fields.Datetime("Last Uploaded", default=fields.Datetime.now, readonly=True)
+    job_ids = fields.One2many('product.import.job', 'import_file_id', string="Import Jobs", readonly=True)
+    log_ids = fields.One2many('product.import.log', 'import_file_id', string="Import Logs", readonly=True)
+
+    _sql_constraints = [
+        ('checksum_uniq', 'unique(checksum)', 'A file with the same content is already stored.'),
+    ]
+
+    @api.model
+    def _get_or_create(self, content, filename=None):
+        """ 按内容哈希查找上传的文件，不存在时创建。相同内容的文件只保存一份 """
+        checksum = hashlib.sha1(content).hexdigest()
+        import_file = self.search([('checksum', '=', checksum)], limit=1)
+        if import_file:
+            import_file.write({
+                'upload_count': import_file.upload_count + 1,
+                'date_last_uploaded': fields.Datetime.now(),
+            })
+        else:
+            import_file = self.create({
+                'checksum': checksum,
+                'file': base64.b64encode(content),
+                'filename': filename,
+                'file_size': len(content),
+            })
+        return import_file
+
+    def _get_source(self):
+        """ 返回供 spreadsheet_reader 读取的文件：附件在 filestore 中时返回文件路径（按需从磁盘读取），
+        存放在数据库中时返回 bytes。两种情况都不需要 base64 解码或临时文件 """
+        self.ensure_one()
+        attachment = self.env['ir.attachment'].sudo().search([
+            ('res_model', '=', self._name),
+            ('res_field', '=', 'file'),
+            ('res_id', '=', self.id),
+        ], limit=1)
+        if not attachment:
+            return None
+        if attachment.store_fname:
+            path = attachment._full_path(attachment.store_fname)
+            if os.path.exists(path):
+                return path
+        return attachment.raw or None
+
+    @api.model
+    def cron_gc_import_files(self, retention_days=None):
+        """ 删除超过保留期未再上传的导入文件。排队中或运行中的任务引用的文件不会删除，日志保留统计信息 """
+        if retention_days is None:
+            retention_days = int(self.env['ir.config_parameter'].sudo().get_param(
+                'product_excel_import_advanced.import_file_retention_days', IMPORT_FILE_RETENTION_DAYS))
+        if retention_days <= 0:
+            return True
+        cutoff = fields.Datetime.now() - timedelta(days=retention_days)
+        expired = self.search([('date_last_uploaded', '<', cutoff)])
+        active_files = self.env['product.import.job'].search([
+            ('import_file_id', 'in', expired.ids),
+            ('state', 'in', ('queued', 'running')),
+        ]).import_file_id
+        expired -= active_files
+        if expired:
+            _logger.info(f"Removing {len(expired)} product import files not uploaded since {cutoff} "
+                         f"({sum(expired.mapped('file_size')) / 1024 / 1024:.1f} MB)")
+            expired.unlink()
+        return True
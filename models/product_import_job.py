@@ -0,0 +1,1251 @@
+import warnings
+# 屏蔽 openpyxl 在读取没有默认样式的 Excel 文件时产生的特定用户警告
+warnings.filterwarnings("ignore", category=UserWarning, module="openpyxl", message="Workbook contains no default style, apply openpyxl's default")
+import base64
+import itertools
+import json
+import logging
+import threading
+import time
+import zlib
+from collections import Counter, defaultdict
+from concurrent.futures import ThreadPoolExecutor
+import psycopg2
+
+from odoo import models, fields, api, Command, _
+from odoo.tools import config
+
+from ..tools import batch_tuner, fingerprint, mapping_profiles, profiling, spreadsheet_reader
+from ..tools.time_budget import cron_time_budget
+from .product_template_import import IMPORT_CONTEXT_KEY
+
+_logger = logging.getLogger(__name__)
+
+# 每次提交的初始行数，运行中根据实测的处理速度与提交耗时自动调整（见 AdaptiveBatchSizer）
+UPSERT_CHUNK_SIZE = 500
+# 单次 cron 运行处理任务的时间预算（秒），超出后提交断点并重新触发 cron 继续处理。
+# prefork 模式下会按 worker 的时间限制收紧（见 cron_time_budget）
+JOB_TIME_BUDGET = 240
+# 并行导入的最大 worker 数
+MAX_WORKER_COUNT = 16
+# 按结果分类的行数统计字段，任务与日志上同名
+IMPORT_STAT_FIELDS = ('created', 'updated', 'unchanged', 'collapsed')
+# 公司相关（保存在 ir.property 中）的导入字段，批量导入时按值分组写入
+PROPERTY_FIELDS = ('property_stock_inventory', 'standard_price')
+# 导入前预扫描文件时每次读取并保存的行数，每个分块单独提交
+PRESCAN_CHUNK_SIZE = 5000
+# 连续多少次运行没有提交任何进度（例如每次都被 worker 的时间或内存限制中止）后将任务标记为失败
+MAX_STALLED_RUNS = 3
+
+
+def sku_partition(sku, partition_count):
+    """ 按 SKU 的稳定哈希（crc32，不受 PYTHONHASHSEED 影响）计算所属分区 """
+    return zlib.crc32(sku.encode('utf-8')) % partition_count
+
+
+class ProductImportJob(models.Model):
+    _name = 'product.import.job'
+    _description = 'Product Import Job'
+    _order = 'id desc'
+
+    name = fields.Char(string="Batch Name", required=True)
+    platform = fields.Selection(selection='_get_platform_selection', string="Platform", required=True)
+    default_stock_location = fields.Many2one('stock.location', string="Default Stock Location", required=True)
+    # 库存盘点库位与成本价是公司相关字段，任务按提交导入的用户与公司运行，而不是 cron 的用户与公司
+    company_id = fields.Many2one('res.company', string="Company", required=True, readonly=True, default=lambda self: self.env.company)
+    user_id = fields.Many2one('res.users', string="Requested By", required=True, readonly=True, default=lambda self: self.env.user)
+    import_mode = fields.Selection([
+        ('bulk', 'Bulk Upsert'),
+        ('row', 'Row by Row'),
+    ], string='Import Mode', default='bulk', required=True)
+    duplicate_policy = fields.Selection([
+        ('last', 'Last Row Wins'),
+        ('first_non_empty', 'First Non-Empty Value Wins'),
+        ('reject', 'Reject as Error'),
+    ], string='Duplicate SKUs', default='last', required=True)
+    scanned_row = fields.Integer("Scanned Rows", readonly=True,
+        help="Excel row number up to which the pre-scan has read the file. An interrupted pre-scan continues after this row.")
+    duplicate_index = fields.Text("Duplicate SKU Index", readonly=True,
+        help="JSON built by a pre-scan of the file: SKUs found on several rows, with their row numbers and merged values.")
+    import_scope = fields.Selection([
+        ('full', 'Full File'),
+        ('delta', 'Changed Rows Only'),
+    ], string='Import Scope', default='full', required=True)
+    archive_missing = fields.Boolean("Archive Missing SKUs",
+        help="Archive the products whose SKU was in the previous successful import of this platform but is no longer in the file.")
+    baseline_log_id = fields.Many2one('product.import.log', string="Compared With", readonly=True, ondelete='set null',
+        help="Previous successful import of this platform whose row hashes the file was compared with.")
+    row_hashes = fields.Binary("Row Hashes", attachment=True, readonly=True,
+        help="gzip JSON {SKU: fingerprint} of the file, built by the pre-scan. Moved to the import log when the job succeeds.")
+    delta_skus = fields.Text("Delta SKUs", readonly=True, help="JSON list of the new and changed SKUs to import in Changed Rows Only scope.")
+    removed_skus = fields.Text("Missing SKUs", readonly=True, help="JSON list of the SKUs of the previous import that are no longer in the file.")
+    import_file_id = fields.Many2one('product.import.file', string="Import File Record", index=True, ondelete='set null',
+        help="Uploaded file, stored once per content. Partition jobs read the file of their parent job.")
+    file = fields.Binary(related='import_file_id.file', string="Import File")
+    filename = fields.Char(string="Filename")
+    state = fields.Selection([
+        ('queued', 'Queued'),
+        ('running', 'Running'),
+        ('done', 'Done'),
+        ('failed', 'Failed'),
+        ('cancelled', 'Cancelled'),
+    ], string="State", default='queued', required=True, index=True)
+    stalled_runs = fields.Integer("Runs Without Progress", readonly=True,
+        help="Consecutive runs that were interrupted before committing any progress. The job fails when this reaches the limit.")
+    last_row = fields.Integer("Last Committed Row", default=1, help="Excel row number of the last committed row. A resumed job continues after this row.")
+    row_count = fields.Integer("Estimated Rows")
+    total = fields.Integer("Processed Rows")
+    success = fields.Integer("Success Rows")
+    failed = fields.Integer("Failed Rows", compute='_compute_failed')
+    created = fields.Integer("Created Rows")
+    updated = fields.Integer("Updated Rows")
+    unchanged = fields.Integer("Unchanged Rows", help="Rows skipped because their import fingerprint matched the product.")
+    collapsed = fields.Integer("Collapsed Rows", help="Rows merged into another row with the same SKU according to the duplicate SKU policy.")
+    archived = fields.Integer("Archived Products", readonly=True)
+    progress = fields.Float("Progress", compute='_compute_progress')
+    message = fields.Text("Message")
+    date_started = fields.Datetime("Started At")
+    date_finished = fields.Datetime("Finished At")
+    log_id = fields.Many2one('product.import.log', string="Import Log", readonly=True, ondelete='set null')
+    worker_count = fields.Integer("Workers", default=1, help="Number of parallel workers. Rows are partitioned by a hash of the SKU, so two workers never touch the same product.")
+    parent_id = fields.Many2one('product.import.job', string="Parent Job", readonly=True, index=True, ondelete='cascade')
+    child_ids = fields.One2many('product.import.job', 'parent_id', string="Partitions", readonly=True)
+    partition_index = fields.Integer("Partition", readonly=True)
+    debug_slow_rows = fields.Integer("Record Slowest Rows", default=0,
+        help="Debug mode: number of slowest rows to record with their SKU. Only rows imported one at a time "
+             "(Row by Row mode, or rows retried after a failed bulk chunk) are timed.")
+    phase_stats = fields.Text("Phase Statistics", readonly=True, help="JSON: wall time, SQL queries and rows per import phase, accumulated over all runs.")
+    phase_summary = fields.Text("Performance", compute='_compute_phase_summary')
+    slow_rows = fields.Text("Slowest Rows", readonly=True, help="JSON list of the slowest rows recorded in debug mode.")
+    cancel_requested = fields.Boolean("Cancellation Requested", compute='_compute_cancel_requested')
+    memory_growth_mb = fields.Float("Memory Growth (MB)", digits=(16, 1), readonly=True,
+        help="Largest growth of the worker's resident memory while this job ran, sampled after each import phase. "
+             "Memory the worker process already used before the job started is not counted.")
+
+    @api.model
+    def _get_platform_selection(self):
+        return self.env['product.import.wizard']._fields['platform'].selection
+
+    @api.depends('total', 'success')
+    def _compute_failed(self):
+        for job in self:
+            job.failed = job.total - job.success
+
+    @api.depends('state', 'last_row', 'row_count', 'child_ids.progress')
+    def _compute_progress(self):
+        for job in self:
+            if job.state == 'done':
+                job.progress = 100.0
+            elif job.child_ids:
+                job.progress = sum(job.child_ids.mapped('progress')) / len(job.child_ids)
+            elif job.row_count:
+                job.progress = min(100.0, (job.last_row - 1) * 100.0 / job.row_count)
+            else:
+                job.progress = 0.0
+
+    @api.depends('phase_stats', 'slow_rows')
+    def _compute_phase_summary(self):
+        for job in self:
+            job.phase_summary = profiling.format_report(json.loads(job.phase_stats or '{}'), json.loads(job.slow_rows or '[]'))
+
+    def _compute_cancel_requested(self):
+        requested = set(self.env['product.import.job.cancel'].search([('job_id', 'in', self.ids)]).job_id.ids)
+        for job in self:
+            job.cancel_requested = job.id in requested
+
+    def action_cancel(self):
+        """ 只登记取消请求，不修改任务行：任务可能正在被 cron 处理，直接修改状态会使处理中的分块提交时发生序列化冲突。
+        处理任务的进程在每个分块开始时读取请求，自己将任务标记为已取消 """
+        jobs = self.filtered(lambda job: job.state in ('queued', 'running') and not job.cancel_requested)
+        self.env['product.import.job.cancel'].create([{'job_id': job.id} for job in jobs])
+        self._trigger_cron()
+        return True
+
+    def action_requeue(self):
+        """ 重新排队失败或取消的任务，从上次提交的断点继续 """
+        self.env['product.import.job.cancel'].search([('job_id', 'in', (self | self.child_ids).ids)]).unlink()
+        (self | self.child_ids).filtered(lambda job: job.state in ('failed', 'cancelled')).write({'state': 'queued', 'date_finished': False, 'stalled_runs': 0})
+        self._trigger_cron()
+        return True
+
+    def _is_cancel_requested(self):
+        """ 直接查询取消请求表（不经过 ORM 缓存）。在提交之后调用时，查询开启的新事务能看到提交之前登记的请求 """
+        self.env.cr.execute("SELECT 1 FROM product_import_job_cancel WHERE job_id IN %s LIMIT 1", [tuple((self | self.parent_id).ids)])
+        return bool(self.env.cr.fetchone())
+
+    @api.model
+    def _trigger_cron(self):
+        cron = self.env.ref('product_excel_import_advanced.ir_cron_product_import_job', raise_if_not_found=False)
+        if cron:
+            cron._trigger()
+
+    @api.model
+    def cron_process_import_jobs(self, time_budget=JOB_TIME_BUDGET):
+        """ 按创建顺序处理排队中的导入任务；被中断的 running 任务从断点继续 """
+        deadline = time.monotonic() + cron_time_budget(time_budget, config)
+        while time.monotonic() < deadline:
+            job = self.search([('state', 'in', ('running', 'queued')), ('parent_id', '=', False)], order='id', limit=1)
+            if not job:
+                return True
+            job = job.with_user(job.user_id).with_company(job.company_id)
+            if job.stalled_runs >= MAX_STALLED_RUNS:
+                job._append_messages([f"CRITICAL: The last {job.stalled_runs} runs were interrupted before committing any progress "
+                                      f"(the worker was probably killed by its time or memory limit). Import stopped."])
+                job.child_ids.filtered(lambda child: child.state in ('queued', 'running')).write({'state': 'failed'})
+                job._finish('failed')
+                continue
+            # 先提交运行次数：运行被强制中止时不会执行到重置计数的地方
+            job.stalled_runs += 1
+            self.env.cr.commit()
+            job._run(deadline)
+            if job.state == 'running':
+                job.stalled_runs = 0
+                self.env.cr.commit()
+                # 时间预算用完，尽快再次调度以继续处理
+                self._trigger_cron()
+                return True
+        return True
+
+    def _run(self, deadline):
+        self.ensure_one()
+        if not self.env.context.get(IMPORT_CONTEXT_KEY):
+            # 导入写入的产品字段不清除导入指纹（见 product_template_import）
+            return self.with_context(**{IMPORT_CONTEXT_KEY: True})._run(deadline)
+        if self._is_cancel_requested():
+            _logger.info(f"Product import job {self.id} was cancelled before Excel row {self.last_row + 1}")
+            (self | self.child_ids).filtered(lambda job: job.state in ('queued', 'running')).write({'state': 'cancelled'})
+            self._finish('cancelled')
+            return
+        if self.worker_count > 1 and not self.parent_id:
+            return self._run_partitioned(deadline)
+
+        # 阶段计时从之前运行保存的数据继续累加，随每个分块一起提交
+        profiler = profiling.PhaseProfiler(parent=profiling.current(), slow_item_limit=self.debug_slow_rows)
+        profiler.merge(json.loads(self.phase_stats or '{}'))
+        for slow_row in json.loads(self.slow_rows or '[]'):
+            profiler.add_slow_item(slow_row)
+        with profiling.activate(profiler):
+            self._run_file(deadline)
+
+    def _run_file(self, deadline):
+        _logger.info(f"Running product import job {self.id} ({self.name}) from Excel row {self.last_row + 1}")
+        try:
+            if self.state == 'queued':
+                self.write({'state': 'running', 'date_started': self.date_started or fields.Datetime.now()})
+                self.env.cr.commit()
+            if not self.parent_id and self.duplicate_index is False:
+                finished = self._scan_file(deadline)
+                if self.duplicate_index is False:
+                    # 预扫描暂停、取消或失败
+                    if finished is not None:
+                        self._finish(finished)
+                    return
+
+            finished = self._process_file(deadline)
+        except Exception as e:
+            _logger.error(f"Product import job {self.id} failed: {e}", exc_info=True)
+            self.env.cr.rollback()
+            self._append_messages([f"CRITICAL: Import job failed. Error: {e}"])
+            self._finish('failed')
+            return
+
+        if finished is not None:
+            self._finish(finished)
+
+    def _run_partitioned(self, deadline):
+        """ 父任务：按 SKU 哈希拆分为 worker_count 个分区任务，每个分区在独立线程、独立游标中处理。
+        文件只由父任务扫描一次，建立索引时每个分区需要导入的行分别保存（见 _select_rows_to_import） """
+        worker_count = min(self.worker_count, MAX_WORKER_COUNT)
+        if self.state == 'queued':
+            vals = {'state': 'running', 'date_started': self.date_started or fields.Datetime.now()}
+            if not self.child_ids:
+                vals['child_ids'] = [Command.create({
+                    'name': f"{self.name} [{index + 1}/{worker_count}]",
+                    'platform': self.platform,
+                    'default_stock_location': self.default_stock_location.id,
+                    'company_id': self.company_id.id,
+                    'user_id': self.user_id.id,
+                    'import_mode': self.import_mode,
+                    'filename': self.filename,
+                    'worker_count': worker_count,
+                    'partition_index': index,
+                    'debug_slow_rows': self.debug_slow_rows,
+                    'duplicate_policy': self.duplicate_policy,
+                }) for index in range(worker_count)]
+            self.write(vals)
+            self.env.cr.commit()
+        if self.duplicate_index is False:
+            # 分区任务共用父任务的预扫描结果，在启动分区之前建立
+            try:
+                finished = self._scan_file(deadline)
+            except Exception as e:
+                _logger.error(f"Product import job {self.id} failed: {e}", exc_info=True)
+                self.env.cr.rollback()
+                self._append_messages([f"CRITICAL: Import job failed. Error: {e}"])
+                self._finish('failed')
+                return
+            if self.duplicate_index is False:
+                if finished is not None:
+                    (self | self.child_ids).filtered(lambda job: job.state in ('queued', 'running')).write({'state': finished})
+                    self._finish(finished)
+                return
+
+        pending = self.child_ids.filtered(lambda child: child.state in ('queued', 'running'))
+        if pending:
+            _logger.info(f"Running product import job {self.id} ({self.name}) with {len(pending)} partition workers")
+            # 结束当前事务：分区任务在各自的游标中提交，之后的查询需要在新的快照中才能看到它们的结果
+            self.env.cr.commit()
+            with ThreadPoolExecutor(max_workers=len(pending), thread_name_prefix='product_import') as executor:
+                profiler = profiling.current()
+                for future in [executor.submit(self._run_partition, child_id, deadline, profiler) for child_id in pending.ids]:
+                    future.result()
+            self.env.cr.commit()
+            self.env.invalidate_all()
+
+        states = set(self.child_ids.mapped('state'))
+        if states & {'queued', 'running'}:
+            return
+        if 'failed' in states:
+            self._finish('failed')
+        elif 'cancelled' in states:
+            self._finish('cancelled')
+        else:
+            self._finish('done')
+
+    def _run_partition(self, job_id, deadline, profiler=None):
+        """ 在工作线程中用独立的游标处理一个分区任务；profiler 为父线程启用的阶段计时器 """
+        threading.current_thread().dbname = self.env.cr.dbname
+        threading.current_thread().uid = self.env.uid
+        with profiling.activate(profiler), self.pool.cursor() as cr:
+            env = api.Environment(cr, self.env.uid, self.env.context)
+            env['product.import.job'].browse(job_id)._run(deadline)
+
+    def _scan_file(self, deadline):
+        """ 导入前分块读取整个文件（不访问产品）。每个分块提取后的行压缩保存为一条 product.import.job.chunk 记录，
+        与扫描断点 scanned_row 一起提交；时间预算用完时返回，下次运行从断点继续。
+        全部读取完成后建立索引（见 _index_scanned_rows），之后的导入只读取保存的分块，不再读取文件。返回值同 _process_file """
+        # 直接读取 filestore 中的附件文件（或数据库中的 bytes），不再解码写入临时文件
+        with profiling.phase('prepare'):
+            source = self.import_file_id._get_source()
+        if not source:
+            self._append_messages(["CRITICAL: The import file is no longer available. Import stopped."])
+            return 'failed'
+        if not self.scanned_row:
+            self.row_count = spreadsheet_reader.estimate_row_count(source)
+        try:
+            profile = mapping_profiles.compile_profile(self.platform, spreadsheet_reader.read_header(source))
+        except ValueError as e:
+            self._append_messages([f"CRITICAL: {e} Import stopped."])
+            return 'failed'
+        Chunk = self.env['product.import.job.chunk']
+        chunks = spreadsheet_reader.iter_row_chunks(source, chunk_size=PRESCAN_CHUNK_SIZE, start_row=self.scanned_row + 1)
+        while True:
+            if self._is_cancel_requested():
+                _logger.info(f"Product import job {self.id} was cancelled while scanning, after Excel row {self.scanned_row}")
+                return 'cancelled'
+            if time.monotonic() >= deadline:
+                _logger.info(f"Product import job {self.id} paused scanning at Excel row {self.scanned_row}, time budget used up")
+                return None
+            with profiling.phase('read') as phase_info:
+                chunk = next(chunks, None)
+                phase_info['rows'] = len(chunk or ())
+            if chunk is None:
+                break
+            with profiling.phase('parse') as phase_info:
+                phase_info['rows'] = len(chunk)
+                rows = profile.extract(chunk)
+            with profiling.phase('commit'):
+                Chunk.create({
+                    'job_id': self.id,
+                    'first_row': chunk[0][0],
+                    'last_row': chunk[-1][0],
+                    'row_count': len(chunk),
+                    'data': base64.b64encode(fingerprint.pack_json(rows)),
+                })
+                vals = {'scanned_row': chunk[-1][0], 'stalled_runs': 0}
+                profiler = profiling.current()
+                if profiler:
+                    vals.update(self._profile_vals(profiler))
+                self.write(vals)
+                self.env.cr.commit()
+            _logger.info(f"Product import job {self.id}: scanned up to Excel row {chunk[-1][0]}")
+        # 扫描完成后行数是确定的；估算值可能为 0（例如没有 dimension 信息的 xlsx）
+        self.row_count = max(self.scanned_row - 1, 0)
+        self._index_scanned_rows(profile)
+        return None
+
+    def _iter_scanned_chunks(self, after_row=0, partition_index=None):
+        """ 按行号顺序逐个读取预扫描保存的分块（只读取含有 after_row 之后的行的分块），每次只解压一个分块。
+        partition_index 不为 None 时只读取该分区的分块。生成 (分块 id, [excel_row_num, vals] 列表) """
+        self.env['product.import.job.chunk'].flush_model()
+        query = "SELECT id FROM product_import_job_chunk WHERE job_id = %s AND last_row > %s"
+        params = [(self.parent_id or self).id, after_row]
+        if partition_index is not None:
+            query += " AND partition_index = %s"
+            params.append(partition_index)
+        self.env.cr.execute(query + " ORDER BY first_row", params)
+        for chunk_id in [row[0] for row in self.env.cr.fetchall()]:
+            self.env.cr.execute("SELECT data FROM product_import_job_chunk WHERE id = %s", [chunk_id])
+            yield chunk_id, fingerprint.unpack_json(base64.b64decode(bytes(self.env.cr.fetchone()[0])), [])
+
+    def _index_scanned_rows(self, profile):
+        """ 从预扫描保存的分块（不再读取文件）建立索引，结果保存在任务上并提交，续跑和分区任务直接复用：
+
+        1. 按 SKU 建立哈希索引，找出出现在多行的 SKU。first_non_empty 策略下再遍历一次分块，
+           只合并重复 SKU 的行；导入时这些 SKU 只在最后一行执行一次 upsert，其余行计为 collapsed；
+        2. 计算每个 SKU 最终导入值的指纹快照，任务成功后随日志保存，作为下一次增量导入的基准；
+        3. 与同一平台上一次成功导入的快照比较，得出新增/变化的 SKU（增量导入只处理这些 SKU）与文件中已消失的 SKU。
+        """
+        location_id = self.default_stock_location.id if self.default_stock_location else False
+        has_ext = 'products_ext.products_ext' in self.env
+        with profiling.phase('index') as phase_info:
+            rows_by_sku = defaultdict(list)
+            row_hashes = {}
+            for _chunk_id, rows in self._iter_scanned_chunks():
+                for excel_row_num, vals in rows:
+                    sku = vals['sku']
+                    if sku:
+                        rows_by_sku[sku].append(excel_row_num)
+                        row_hashes[sku] = fingerprint.row_fingerprint(vals, location_id, has_ext)
+            phase_info['rows'] = sum(len(rows) for rows in rows_by_sku.values())
+            duplicates = {sku: {'rows': rows} for sku, rows in rows_by_sku.items() if len(rows) > 1}
+            file_skus = set(rows_by_sku)
+            del rows_by_sku
+
+            if duplicates and self.duplicate_policy == 'first_non_empty':
+                vals_by_sku = defaultdict(list)
+                for _chunk_id, rows in self._iter_scanned_chunks():
+                    for _excel_row_num, vals in rows:
+                        if vals['sku'] in duplicates:
+                            vals_by_sku[vals['sku']].append(vals)
+                for sku, vals_list in vals_by_sku.items():
+                    duplicates[sku]['vals'] = profile.merge_first_non_empty(vals_list)
+                    row_hashes[sku] = fingerprint.row_fingerprint(duplicates[sku]['vals'], location_id, has_ext)
+            elif self.duplicate_policy == 'reject':
+                for sku in duplicates:
+                    row_hashes.pop(sku)
+
+        _logger.info(f"Product import job {self.id}: {len(duplicates)} SKUs appear on more than one row "
+                     f"({sum(len(entry['rows']) for entry in duplicates.values())} rows), policy: {self.duplicate_policy}")
+        vals = {
+            'duplicate_index': json.dumps(duplicates, ensure_ascii=False),
+            'row_hashes': base64.b64encode(fingerprint.pack_row_hashes(row_hashes)),
+        }
+        messages = []
+        baseline = self._get_baseline_log()
+        if baseline and (self.import_scope == 'delta' or self.archive_missing):
+            baseline_hashes = fingerprint.unpack_row_hashes(base64.b64decode(baseline.row_hashes))
+            inserted = [sku for sku in row_hashes if sku not in baseline_hashes]
+            changed = [sku for sku, row_hash in row_hashes.items() if sku in baseline_hashes and baseline_hashes[sku] != row_hash]
+            removed = [sku for sku in baseline_hashes if sku not in file_skus]
+            vals['baseline_log_id'] = baseline.id
+            if self.import_scope == 'delta':
+                vals['delta_skus'] = json.dumps(inserted + changed, ensure_ascii=False)
+            if self.archive_missing:
+                vals['removed_skus'] = json.dumps(removed, ensure_ascii=False)
+            messages.append(f"Compared with import log '{baseline.name}' (ID {baseline.id}): {len(inserted)} new, "
+                            f"{len(changed)} changed, {len(removed)} missing SKUs.")
+        elif self.import_scope == 'delta':
+            messages.append("No previous successful import with row hashes for this platform, importing the full file.")
+        for msg in messages:
+            _logger.info(f"Product import job {self.id}: {msg}")
+        self.write(vals)
+        self._append_messages(messages)
+        self._select_rows_to_import(duplicates, set(json.loads(vals['delta_skus'])) if 'delta_skus' in vals else None)
+        self.env.cr.commit()
+
+    def _select_rows_to_import(self, duplicates, delta_skus):
+        """ 按重复 SKU 策略与增量范围筛选保存的分块，每个分块只保留需要 upsert 的行，其余的行在这里直接计数并记录信息：
+        空 SKU 的行跳过；reject 策略下重复 SKU 的所有行计为失败；其它策略下重复 SKU 只保留最后一行（使用合并后的值），
+        其余行计为 collapsed；增量导入时不在 delta_skus 中的行计为 unchanged。导入阶段只读取保留下来的行。
+        分区导入时保留的行按 SKU 哈希拆分，每个分区保存为单独的分块，分区任务只读取自己的分块 """
+        Chunk = self.env['product.import.job.chunk']
+        partition_count = len(self.child_ids) or 1
+        policy_label = dict(self._fields['duplicate_policy'].selection)[self.duplicate_policy]
+        error_msgs = []
+        stats = Counter()
+        rejected = 0
+        with profiling.phase('index'):
+            for chunk_id, rows in self._iter_scanned_chunks():
+                selected = []
+                for excel_row_num, vals in rows:
+                    sku = vals['sku']
+                    if not sku:
+                        msg = f"Row {excel_row_num}: SKU is empty, skipping this row."
+                        error_msgs.append(msg)
+                        _logger.warning(msg)
+                        continue
+                    duplicate = duplicates.get(sku)
+                    if duplicate:
+                        duplicate_rows = duplicate['rows']
+                        if self.duplicate_policy == 'reject':
+                            msg = f"Row {excel_row_num} (SKU: {sku}): SKU appears on rows {duplicate_rows}, rejected."
+                            error_msgs.append(msg)
+                            _logger.warning(msg)
+                            rejected += 1
+                            continue
+                        # 同一 SKU 只在最后一行执行一次 upsert
+                        if excel_row_num != duplicate_rows[-1]:
+                            stats['collapsed'] += 1
+                            continue
+                        if delta_skus is None or sku in delta_skus:
+                            error_msgs.append(f"SKU {sku}: rows {duplicate_rows} collapsed into one upsert ({policy_label}).")
+                        vals = duplicate.get('vals', vals)
+                    # 增量导入时只处理新增与变化的 SKU，其余行与上一次成功导入完全相同
+                    if delta_skus is not None and sku not in delta_skus:
+                        stats['unchanged'] += 1
+                        continue
+                    selected.append([excel_row_num, vals])
+                if partition_count > 1:
+                    partitions = defaultdict(list)
+                    for row in selected:
+                        partitions[sku_partition(row[1]['sku'], partition_count)].append(row)
+                    Chunk.create([{
+                        'job_id': self.id,
+                        'partition_index': partition_index,
+                        'first_row': partition_rows[0][0],
+                        'last_row': partition_rows[-1][0],
+                        'row_count': len(partition_rows),
+                        'data': base64.b64encode(fingerprint.pack_json(partition_rows)),
+                    } for partition_index, partition_rows in partitions.items()])
+                    Chunk.browse(chunk_id).unlink()
+                    Chunk.invalidate_model(['data'])
+                elif not selected:
+                    Chunk.browse(chunk_id).unlink()
+                elif len(selected) < len(rows):
+                    Chunk.browse(chunk_id).write({
+                        'first_row': selected[0][0],
+                        'last_row': selected[-1][0],
+                        'row_count': len(selected),
+                        'data': base64.b64encode(fingerprint.pack_json(selected)),
+                    })
+                    Chunk.browse(chunk_id).invalidate_recordset(['data'])
+        # 分区导入时计入第一个分区任务：父任务结束时的计数是各分区任务之和
+        counted_job = self.child_ids.filtered(lambda child: child.partition_index == 0) or self
+        skipped = stats['collapsed'] + stats['unchanged']
+        vals = {
+            'total': counted_job.total + skipped + rejected,
+            'success': counted_job.success + skipped,
+        }
+        for stat_field in IMPORT_STAT_FIELDS:
+            vals[stat_field] = counted_job[stat_field] + stats[stat_field]
+        counted_job.write(vals)
+        self._append_messages(error_msgs)
+
+    def _get_baseline_log(self):
+        """ 同一公司、同一平台最近一次成功完成的导入的日志。只有最近一次的快照可以作为基准，它没有快照时返回空记录 """
+        previous = self.search([
+            ('platform', '=', self.platform),
+            ('company_id', '=', self.company_id.id),
+            ('parent_id', '=', False),
+            ('state', '=', 'done'),
+            ('log_id', '!=', False),
+            ('id', '!=', self.id),
+        ], order='date_finished desc, id desc', limit=1)
+        return previous.log_id if previous.log_id.with_context(bin_size=True).row_hashes else self.env['product.import.log']
+
+    def _clear_previous_row_hashes(self):
+        """ 只有同一公司、同一平台最近一次成功导入的快照会被用作基准（见 _get_baseline_log），
+        本任务成功后，之前所有导入日志上的快照都不再需要，无论它们是否是本任务的基准 """
+        previous_logs = self.search([
+            ('platform', '=', self.platform),
+            ('company_id', '=', self.company_id.id),
+            ('parent_id', '=', False),
+            ('log_id', '!=', False),
+            ('id', '!=', self.id),
+        ]).log_id
+        snapshots = self.env['ir.attachment'].search([
+            ('res_model', '=', 'product.import.log'),
+            ('res_field', '=', 'row_hashes'),
+            ('res_id', 'in', previous_logs.ids),
+        ])
+        if snapshots:
+            self.env['product.import.log'].browse(snapshots.mapped('res_id')).write({'row_hashes': False})
+            _logger.info(f"Product import job {self.id}: cleared the row hashes of {len(snapshots)} previous import logs")
+
+    def _applied_row_hashes(self):
+        """ 只保留产品上的导入指纹与快照一致的 SKU（即确实已按这些值导入）。
+        失败、被拒绝或之后被其它方式修改的产品不会进入快照，下一次增量导入时会重新处理 """
+        row_hashes = fingerprint.unpack_row_hashes(base64.b64decode(self.row_hashes))
+        if not row_hashes:
+            return {}
+        self.env['product.product'].flush_model(['default_code', 'import_fingerprint'])
+        self.env.cr.execute("""
+            SELECT p.default_code, p.import_fingerprint
+              FROM product_product p
+             WHERE p.default_code = ANY(%s)
+        """, [list(row_hashes)])
+        return {sku: row_hash for sku, row_hash in self.env.cr.fetchall() if row_hashes.get(sku) == row_hash}
+
+    def _archive_missing_products(self):
+        """ 归档基准快照中有、本次文件中已没有的 SKU 对应的产品模板 """
+        removed = json.loads(self.removed_skus or '[]')
+        if not removed:
+            return
+        templates = self.env['product.product'].search([('default_code', 'in', removed)]).product_tmpl_id
+        archived = templates.browse()
+        error_msgs = []
+        try:
+            with self.env.cr.savepoint():
+                templates.write({'active': False})
+                archived = templates
+        except Exception as e_archive:
+            _logger.warning(f"Archiving {len(templates)} missing products failed, retrying one by one: {e_archive}")
+            for template in templates:
+                try:
+                    with self.env.cr.savepoint():
+                        template.write({'active': False})
+                        archived |= template
+                except Exception as e_row:
+                    msg = f"SKU {template.default_code}: Could not archive the product missing from the file: {str(e_row)}"
+                    error_msgs.append(msg)
+                    _logger.error(msg)
+        error_msgs.append(f"Archived {len(archived)} products whose SKU is no longer in the file.")
+        self.archived = len(archived)
+        self._append_messages(error_msgs)
+
+    def _process_file(self, deadline):
+        """ 从断点开始按分块导入预扫描保存的行（见 _select_rows_to_import），不再读取文件。
+        返回最终状态（'done'/'failed'/'cancelled'），时间预算用完时返回 None """
+        start_row = self.last_row
+        scanned_rows = (
+            row
+            for _chunk_id, rows in self._iter_scanned_chunks(after_row=start_row, partition_index=self.partition_index if self.parent_id else None)
+            for row in rows
+            if row[0] > start_row
+        )
+        sizer = batch_tuner.AdaptiveBatchSizer(initial_size=UPSERT_CHUNK_SIZE)
+        while True:
+            if self._is_cancel_requested():
+                _logger.info(f"Product import job {self.id} was cancelled at Excel row {self.last_row}")
+                return 'cancelled'
+            if time.monotonic() >= deadline:
+                _logger.info(f"Product import job {self.id} paused at Excel row {self.last_row}, time budget used up")
+                return None
+
+            error_msgs = []
+            with profiling.phase('read') as phase_info:
+                chunk = list(itertools.islice(scanned_rows, sizer()))
+                phase_info['rows'] = len(chunk)
+            if not chunk:
+                if not self.parent_id and not self.total:
+                    _logger.info("No valid product data found in the Excel file to import.")
+                    self._append_messages([_("No valid product data found in the uploaded Excel file.")])
+                return 'done'
+
+            products_data = [(excel_row_num, vals) for excel_row_num, vals in chunk]
+            chunk_begin = time.monotonic()
+            chunk_success = 0
+            stats = Counter()
+            if products_data:
+                with profiling.phase('write') as phase_info:
+                    phase_info['rows'] = len(products_data)
+                    if self.import_mode == 'bulk':
+                        chunk_success = self._import_rows_bulk(products_data, error_msgs, stats)
+                    else:
+                        chunk_success = self._import_rows_sequential(products_data, error_msgs, stats)
+            work_elapsed = time.monotonic() - chunk_begin
+
+            with profiling.phase('commit') as phase_info:
+                phase_info['rows'] = len(products_data)
+                committed = self._commit_chunk(chunk[-1][0], len(products_data), chunk_success, error_msgs, stats)
+            if not committed:
+                return 'failed'
+            commit_elapsed = time.monotonic() - chunk_begin - work_elapsed
+            next_size = sizer.record(len(chunk), work_elapsed, commit_elapsed)
+            _logger.info(f"Job {self.id}: committed chunk of {len(products_data)} rows in {work_elapsed + commit_elapsed:.2f}s "
+                         f"({len(products_data) / work_elapsed if work_elapsed else 0:.1f} rows/s, commit {commit_elapsed * 1000:.0f}ms). "
+                         f"Last processed Excel row: {chunk[-1][0]}. Next chunk size: {next_size}")
+
+    def _append_messages(self, error_msgs):
+        if error_msgs:
+            new_message = '\n'.join(error_msgs)
+            self.message = f"{self.message}\n{new_message}" if self.message else new_message
+
+    def _commit_chunk(self, last_row_num, processed, success, error_msgs, stats):
+        """ 将断点与该分块的数据在同一事务中提交，失败时记录错误并返回 False """
+        try:
+            self._append_messages(error_msgs)
+            vals = {
+                'last_row': last_row_num,
+                'stalled_runs': 0,
+                'total': self.total + processed,
+                'success': self.success + success,
+            }
+            for stat_field in IMPORT_STAT_FIELDS:
+                vals[stat_field] = self[stat_field] + stats[stat_field]
+            profiler = profiling.current()
+            if profiler:
+                vals.update(self._profile_vals(profiler))
+            self.write(vals)
+            self.env.cr.commit()
+            self._release_chunk_cache()
+            return True
+        except psycopg2.Error as e_commit_db:
+            _logger.error(f"CRITICAL: Database error during commit of chunk ending at Excel row {last_row_num}: {e_commit_db}", exc_info=True)
+            self.env.cr.rollback()
+            self._append_messages([f"CRITICAL: DB commit failed at row {last_row_num}. Import stopped. Error: {e_commit_db}"])
+        except Exception as e_commit:
+            _logger.error(f"CRITICAL: Error committing chunk ending at Excel row {last_row_num}: {e_commit}", exc_info=True)
+            self.env.cr.rollback()
+            self._append_messages([f"CRITICAL: Commit failed at row {last_row_num}. Import stopped. Error: {e_commit}"])
+        return False
+
+    def _release_chunk_cache(self):
+        """ 提交后只清除本分块读写过的产品记录缓存，保持内存占用稳定；其余缓存（任务、库位、公司等）保留 """
+        for model_name in ('product.product', 'product.template', 'products_ext.products_ext'):
+            if model_name in self.env:
+                self.env[model_name].invalidate_model(flush=False)
+
+    def _profile_vals(self, profiler):
+        """ 将 profiler 的阶段数据转换为任务字段的值 """
+        return {
+            'phase_stats': json.dumps(profiler.as_dict()),
+            'slow_rows': json.dumps(profiler.slowest()) if profiler.slow_item_limit else False,
+            'memory_growth_mb': max(self.memory_growth_mb, profiler.memory_growth_kb() / 1024),
+        }
+
+    def _finish(self, state):
+        """ 任务结束：写入导入日志并提交。分区任务只更新状态，由父任务汇总后写入一条日志 """
+        vals = {'state': state, 'date_finished': fields.Datetime.now()}
+        profiler = profiling.current()
+        if self.child_ids:
+            profiler = profiling.PhaseProfiler(slow_item_limit=self.debug_slow_rows)
+            for child in self.child_ids:
+                profiler.merge(json.loads(child.phase_stats or '{}'))
+                for slow_row in json.loads(child.slow_rows or '[]'):
+                    profiler.add_slow_item(slow_row)
+            vals.update({
+                'total': sum(self.child_ids.mapped('total')),
+                'success': sum(self.child_ids.mapped('success')),
+                'message': '\n'.join(filter(None, [self.message] + self.child_ids.mapped('message'))),
+            })
+            for stat_field in IMPORT_STAT_FIELDS:
+                vals[stat_field] = sum(self.child_ids.mapped(stat_field))
+        if profiler:
+            vals.update(self._profile_vals(profiler))
+        if self.child_ids:
+            vals['memory_growth_mb'] = max(self.child_ids.mapped('memory_growth_mb') + [vals.get('memory_growth_mb', 0.0)])
+        self.write(vals)
+        if self.parent_id:
+            self.env.cr.commit()
+            return
+        # 任务已结束，之后到达的取消请求不再有意义
+        self.env['product.import.job.cancel'].search([('job_id', 'in', (self | self.child_ids).ids)]).unlink()
+        if state == 'done':
+            # 失败或取消的任务保留预扫描的分块，重新排队后从断点继续
+            self.env['product.import.job.chunk'].search([('job_id', '=', self.id)]).unlink()
+        row_hashes = {}
+        if state == 'done' and self.row_hashes:
+            if self.archive_missing:
+                self._archive_missing_products()
+            row_hashes = self._applied_row_hashes()
+        elapsed = (self.date_finished - self.date_started).total_seconds() if self.date_started else 0
+        _logger.info(f"Product import job {self.id} finished with state {state}. Total rows: {self.total}, Successful: {self.success} "
+                     f"(created: {self.created}, updated: {self.updated}, unchanged: {self.unchanged}), "
+                     f"Elapsed: {elapsed:.0f}s ({self.total / elapsed if elapsed else 0:.1f} rows/s, mode: {self.import_mode})")
+        if self.phase_stats:
+            _logger.info(f"Product import job {self.id} phases:\n{self.phase_summary}")
+        phases = json.loads(self.phase_stats or '{}')
+        try:
+            self.log_id = self.env['product.import.log'].create({
+                'name': self.name,
+                'total': self.total,
+                'success': self.success,
+                'failed': self.total - self.success,
+                'created': self.created,
+                'updated': self.updated,
+                'unchanged': self.unchanged,
+                'collapsed': self.collapsed,
+                'archived': self.archived,
+                'platform': self.platform,
+                'default_stock_location': self.default_stock_location.id,
+                'import_file_id': self.import_file_id.id,
+                'message': self.message,
+                'duration': sum(entry['seconds'] for entry in phases.values()),
+                'query_count': sum(entry['queries'] for entry in phases.values()),
+                'memory_growth_mb': self.memory_growth_mb,
+                'phase_stats': self.phase_stats,
+                'slow_rows': self.slow_rows,
+                'row_hashes': base64.b64encode(fingerprint.pack_row_hashes(row_hashes)) if row_hashes else False,
+            })
+            # 快照只在任务上暂存
+            self.row_hashes = False
+            if state == 'done':
+                self._clear_previous_row_hashes()
+            _logger.info("Import log record created.")
+        except psycopg2.Error as log_db_e: # Catch specific DB error for logging
+             _logger.error(f"CRITICAL: Database error while creating import log: {log_db_e}", exc_info=True)
+             self.env.cr.rollback()
+             self.write({'state': state, 'date_finished': fields.Datetime.now()})
+        except Exception as log_e:
+            _logger.error(f"CRITICAL: Failed to create import log record: {log_e}", exc_info=True)
+        self.env.cr.commit()
+
+    def _import_rows_sequential(self, products_data, error_msgs, stats):
+        """ 逐行导入一个分块，返回成功行数。每行在独立的 savepoint 中执行，出错时只回滚该行 """
+        successful_imports = 0
+        location_id = self.default_stock_location.id if self.default_stock_location else False
+        has_ext = 'products_ext.products_ext' in self.env
+
+        for excel_row_num, row_vals in products_data:
+            try:
+                with profiling.item(excel_row=excel_row_num, sku=row_vals['sku']), self.env.cr.savepoint():
+                    outcome = self._import_row(excel_row_num, row_vals, error_msgs, location_id, has_ext)
+            except psycopg2.Error as e_db_row: # Catch psycopg2 errors specifically
+                msg = f"Row {excel_row_num} (SKU: {row_vals['sku'] or 'N/A'}): Database error: {str(e_db_row)}"
+                error_msgs.append(msg)
+                _logger.error(msg, exc_info=True)
+                continue
+            except Exception as e_row:
+                msg = f"Row {excel_row_num} (SKU: {row_vals['sku'] or 'N/A'}): Processing error: {str(e_row)}"
+                error_msgs.append(msg)
+                _logger.error(msg, exc_info=True)
+                continue
+            if outcome:
+                stats[outcome] += 1
+                successful_imports += 1
+
+        return successful_imports
+
+    def _import_row(self, excel_row_num, row_vals, error_msgs, location_id, has_ext):
+        """ 导入单行，返回 'created' / 'updated'，无法创建产品变体时返回 None """
+        sku = row_vals['sku']
+        product_name = row_vals['product_name']
+        image_url = row_vals['image_url']
+        product_url_ext = row_vals['product_url_ext']
+        decl_name_en_ext = row_vals['decl_name_en_ext']
+        decl_name_cn_ext = row_vals['decl_name_cn_ext']
+
+        _logger.info(f"Processing Excel row {excel_row_num}, SKU: {sku}")
+        #print(f"Processing Excel row {excel_row_num}, SKU: {sku}")
+        
+        with profiling.phase('lookup'):
+            product = self.env['product.product'].search([('default_code', '=', sku)], limit=1)
+        product_tmpl = None
+
+        if not product:
+            product_tmpl_vals = {
+                'name': product_name,
+                'default_code': sku,
+                'detailed_type': 'product',
+            }
+            if(self.default_stock_location):
+                product_tmpl_vals['property_stock_inventory'] = self.default_stock_location.id
+            product_tmpl = self.env['product.template'].create(product_tmpl_vals)
+            product = product_tmpl.product_variant_ids[:1]
+            if not product:
+                msg = f"Row {excel_row_num} (SKU: {sku}): Failed to create product variant."
+                error_msgs.append(msg)
+                _logger.error(msg)
+                return None
+            _logger.info(f"Row {excel_row_num}: Created product '{product.name}' (ID: {product.id}) for SKU {sku}")
+            outcome = 'created'
+        else:
+            outcome = 'updated'
+            product_tmpl = product.product_tmpl_id
+            if product_tmpl.name != product_name:
+                product_tmpl.write({'name': product_name})
+                _logger.info(f"Row {excel_row_num}: Updated name for SKU {sku} to '{product_name}'")
+            # 更新库存位置
+            if self.default_stock_location and product_tmpl.property_stock_inventory != self.default_stock_location:
+                product_tmpl.property_stock_inventory = self.default_stock_location
+        
+        
+        if image_url and image_url.startswith(('http://', 'https://')):
+            if product_tmpl.image_url != image_url:
+                product_tmpl.image_url = image_url
+                _logger.info(f"Row {excel_row_num}: Set image_url for SKU {sku} to {image_url}")
+
+        weight_val = row_vals['weight']
+        if weight_val is None:
+            msg = f"Row {excel_row_num} (SKU: {sku}): Invalid weight value '{row_vals['weight_str']}'."
+            error_msgs.append(msg)
+            _logger.warning(msg)
+        elif product_tmpl.weight != weight_val:
+            product_tmpl.weight = weight_val
+        
+        cost_price_val = row_vals['cost_price']
+        if cost_price_val is None:
+            msg = f"Row {excel_row_num} (SKU: {sku}): Invalid cost price value '{row_vals['cost_price_str']}'."
+            error_msgs.append(msg)
+            _logger.warning(msg)
+        elif product.standard_price != cost_price_val:
+            product.standard_price = cost_price_val
+
+        if has_ext:
+            
+            decl_price_val_ext = row_vals['decl_price_ext']
+            if decl_price_val_ext is None:
+                msg = f"Row {excel_row_num} (SKU: {sku}): Invalid declared price '{row_vals['decl_price_ext_str']}'. Using 0.0."
+                error_msgs.append(msg)
+                _logger.warning(msg)
+                decl_price_val_ext = 0.0
+            
+            ext_record = self.env['products_ext.products_ext'].search([('product_id', '=', product.id)], limit=1)
+            ext_vals = {
+                'product_url': product_url_ext,
+                'declared_name_en': decl_name_en_ext,
+                'declared_name_cn': decl_name_cn_ext,
+                'declared_price': decl_price_val_ext,
+            }
+            if not ext_record:
+                ext_vals['product_id'] = product.id
+                self.env['products_ext.products_ext'].create(ext_vals)
+            else:
+                ext_record.write(ext_vals)
+        else:
+            _logger.debug("Model 'products_ext.products_ext' not found. Skipping.")
+
+        product.import_fingerprint = fingerprint.row_fingerprint(row_vals, location_id, has_ext)
+        return outcome
+
+    def _import_rows_bulk(self, products_data, error_msgs, stats):
+        """ 批量 upsert 一个分块：只做一次 SKU 查询，批量 create，按相同值分组 write。
+        整个分块在一个 savepoint 中执行；数据库错误只回滚该分块，然后逐行重试以定位出错的行 """
+        try:
+            with self.env.cr.savepoint():
+                chunk_msgs = []
+                chunk_stats = Counter()
+                successful = self._upsert_chunk(products_data, chunk_msgs, chunk_stats)
+        except Exception as e_chunk:
+            _logger.warning(f"Error in chunk starting at Excel row {products_data[0][0]}, retrying row by row: {e_chunk}")
+        else:
+            error_msgs.extend(chunk_msgs)
+            stats.update(chunk_stats)
+            return successful
+
+        successful = 0
+        for excel_row_num, row_vals in products_data:
+            try:
+                with profiling.item(excel_row=excel_row_num, sku=row_vals['sku']), self.env.cr.savepoint():
+                    row_msgs = []
+                    row_stats = Counter()
+                    successful += self._upsert_chunk([(excel_row_num, row_vals)], row_msgs, row_stats)
+            except psycopg2.Error as e_db_row:
+                msg = f"Row {excel_row_num} (SKU: {row_vals['sku'] or 'N/A'}): Database error: {str(e_db_row)}"
+                error_msgs.append(msg)
+                _logger.error(msg)
+                continue
+            except Exception as e_row:
+                msg = f"Row {excel_row_num} (SKU: {row_vals['sku'] or 'N/A'}): Processing error: {str(e_row)}"
+                error_msgs.append(msg)
+                _logger.error(msg, exc_info=True)
+                continue
+            error_msgs.extend(row_msgs)
+            stats.update(row_stats)
+        return successful
+
+    def _upsert_chunk(self, chunk, error_msgs, stats):
+        """ 处理一个分块，返回成功的行数。同一分块内重复的 SKU 会顺延到下一轮，保证按行顺序生效 """
+        successful = 0
+        pending = chunk
+        while pending:
+            seen_skus = set()
+            batch, deferred = [], []
+            for row in pending:
+                if row[1]['sku'] in seen_skus:
+                    deferred.append(row)
+                else:
+                    seen_skus.add(row[1]['sku'])
+                    batch.append(row)
+            successful += self._upsert_rows(batch, error_msgs, stats)
+            pending = deferred
+        return successful
+
+    def _upsert_rows(self, rows, error_msgs, stats):
+        """ 对一组 SKU 互不相同的行执行 upsert，返回成功的行数。
+        指纹与产品上保存的一致的行不会产生任何写入 """
+        Product = self.env['product.product']
+        Template = self.env['product.template']
+        location_id = self.default_stock_location.id if self.default_stock_location else False
+        has_ext = 'products_ext.products_ext' in self.env
+
+        existing = {}
+        with profiling.phase('lookup') as phase_info:
+            phase_info['rows'] = len(rows)
+            for product in Product.search([('default_code', 'in', [vals['sku'] for _, vals in rows])]):
+                existing.setdefault(product.default_code, product)
+
+        failed_rows = set()
+        parsed = {}
+        for excel_row_num, vals in rows:
+            sku = vals['sku']
+            parsed_vals = {}
+            image_url = vals['image_url']
+            if image_url and image_url.startswith(('http://', 'https://')):
+                parsed_vals['image_url'] = image_url
+            if vals['weight'] is None:
+                msg = f"Row {excel_row_num} (SKU: {sku}): Invalid weight value '{vals['weight_str']}'."
+                error_msgs.append(msg)
+                _logger.warning(msg)
+            else:
+                parsed_vals['weight'] = vals['weight']
+            if vals['cost_price'] is None:
+                msg = f"Row {excel_row_num} (SKU: {sku}): Invalid cost price value '{vals['cost_price_str']}'."
+                error_msgs.append(msg)
+                _logger.warning(msg)
+            else:
+                parsed_vals['standard_price'] = vals['cost_price']
+            parsed[excel_row_num] = parsed_vals
+
+        # 0. 指纹对比：已存在变体的指纹一次批量预取，未变化的行直接跳过
+        fingerprints = {
+            excel_row_num: fingerprint.row_fingerprint(vals, location_id, has_ext)
+            for excel_row_num, vals in rows
+        }
+        with profiling.phase('lookup'):
+            unchanged_rows = {
+                excel_row_num for excel_row_num, vals in rows
+                if vals['sku'] in existing
+                and existing[vals['sku']].import_fingerprint == fingerprints[excel_row_num]
+            }
+        stats['unchanged'] += len(unchanged_rows)
+        if unchanged_rows:
+            rows = [row for row in rows if row[0] not in unchanged_rows]
+
+        # 1. 新 SKU：一次 create(vals_list)
+        to_create = [(excel_row_num, vals) for excel_row_num, vals in rows if vals['sku'] not in existing]
+        if to_create:
+            vals_list = []
+            for excel_row_num, vals in to_create:
+                product_tmpl_vals = {
+                    'name': vals['product_name'],
+                    'default_code': vals['sku'],
+                    'detailed_type': 'product',
+                }
+                # 公司相关字段在第 3 步与已存在的产品一起按值分组写入
+                product_tmpl_vals.update({
+                    field: value for field, value in parsed[excel_row_num].items()
+                    if field not in PROPERTY_FIELDS
+                })
+                vals_list.append(product_tmpl_vals)
+            try:
+                with self.env.cr.savepoint():
+                    templates = Template.create(vals_list)
+            except Exception as e_create:
+                # 批量创建失败时逐行重试，定位出错的行
+                _logger.warning(f"Bulk create of {len(vals_list)} templates failed, retrying row by row: {e_create}")
+                templates = Template
+                for (excel_row_num, vals), product_tmpl_vals in zip(to_create, vals_list):
+                    try:
+                        with self.env.cr.savepoint():
+                            templates |= Template.create(product_tmpl_vals)
+                    except Exception as e_row:
+                        msg = f"Row {excel_row_num} (SKU: {vals['sku']}): Processing error: {str(e_row)}"
+                        error_msgs.append(msg)
+                        _logger.error(msg)
+                        failed_rows.add(excel_row_num)
+                to_create = [row for row in to_create if row[0] not in failed_rows]
+            for (excel_row_num, vals), product_tmpl in zip(to_create, templates):
+                product = product_tmpl.product_variant_ids[:1]
+                if not product:
+                    msg = f"Row {excel_row_num} (SKU: {vals['sku']}): Failed to create product variant."
+                    error_msgs.append(msg)
+                    _logger.error(msg)
+                    failed_rows.add(excel_row_num)
+                    continue
+                existing[vals['sku']] = product
+                _logger.info(f"Row {excel_row_num}: Created product '{product_tmpl.name}' (ID: {product.id}) for SKU {vals['sku']}")
+        created_rows = {excel_row_num for excel_row_num, _vals in to_create}
+
+        # 2. 已存在的 SKU：只写入有变化的字段，值相同的记录合并成一次 write
+        template_writes = defaultdict(list)
+        row_by_record = {}
+        for excel_row_num, vals in rows:
+            if excel_row_num in failed_rows or excel_row_num in created_rows:
+                continue
+            product = existing[vals['sku']]
+            product_tmpl = product.product_tmpl_id
+            parsed_vals = parsed[excel_row_num]
+            tmpl_vals = {}
+            if product_tmpl.name != vals['product_name']:
+                tmpl_vals['name'] = vals['product_name']
+            if 'image_url' in parsed_vals and product_tmpl.image_url != parsed_vals['image_url']:
+                tmpl_vals['image_url'] = parsed_vals['image_url']
+            if 'weight' in parsed_vals and product_tmpl.weight != parsed_vals['weight']:
+                tmpl_vals['weight'] = parsed_vals['weight']
+            if tmpl_vals:
+                template_writes[tuple(sorted(tmpl_vals.items()))].append(product_tmpl.id)
+                row_by_record[('product.template', product_tmpl.id)] = (excel_row_num, vals['sku'])
+
+        # 3. 公司相关字段（库存盘点库位、成本价）保存在 ir.property 中，逐条赋值时每条记录都要单独读取、比较和写入属性。
+        #    这里对分块内所有成功的行（包括新建的）一次批量预取当前值，只对值不同的记录按值分组，每个值一次 write
+        location_writes = defaultdict(list)
+        cost_writes = defaultdict(list)
+        property_rows = [(excel_row_num, vals, existing[vals['sku']]) for excel_row_num, vals in rows if excel_row_num not in failed_rows]
+        if property_rows:
+            IrProperty = self.env['ir.property']
+            with profiling.phase('lookup'):
+                IrProperty.flush_model()
+                products = Product.browse([product.id for _r, _v, product in property_rows])
+                current_locations = IrProperty._get_multi('property_stock_inventory', 'product.template', products.product_tmpl_id.ids) if location_id else {}
+                current_costs = IrProperty._get_multi('standard_price', 'product.product', products.ids)
+            for excel_row_num, vals, product in property_rows:
+                parsed_vals = parsed[excel_row_num]
+                product_tmpl_id = product.product_tmpl_id.id
+                if location_id and current_locations[product_tmpl_id].id != location_id:
+                    location_writes[(('property_stock_inventory', location_id),)].append(product_tmpl_id)
+                    row_by_record[('product.template', product_tmpl_id)] = (excel_row_num, vals['sku'])
+                if 'standard_price' in parsed_vals and current_costs[product.id] != parsed_vals['standard_price']:
+                    cost_writes[(('standard_price', parsed_vals['standard_price']),)].append(product.id)
+                    row_by_record[('product.product', product.id)] = (excel_row_num, vals['sku'])
+
+        for model_name, writes in (('product.template', template_writes),
+                                   ('product.template', location_writes),
+                                   ('product.product', cost_writes)):
+            for write_key, record_ids in writes.items():
+                records = self.env[model_name].browse(record_ids)
+                try:
+                    with self.env.cr.savepoint():
+                        records.write(dict(write_key))
+                except Exception as e_write:
+                    _logger.warning(f"Grouped write of {len(records)} {model_name} records failed, retrying one by one: {e_write}")
+                    for record in records:
+                        excel_row_num, sku = row_by_record[(model_name, record.id)]
+                        try:
+                            with self.env.cr.savepoint():
+                                record.write(dict(write_key))
+                        except Exception as e_row:
+                            msg = f"Row {excel_row_num} (SKU: {sku}): Processing error: {str(e_row)}"
+                            error_msgs.append(msg)
+                            _logger.error(msg)
+                            failed_rows.add(excel_row_num)
+
+        # 4. 报关扩展信息
+        if has_ext:
+            ext_rows = [
+                (excel_row_num, vals, existing[vals['sku']])
+                for excel_row_num, vals in rows
+                if excel_row_num not in failed_rows
+            ]
+            if ext_rows:
+                self._sync_products_ext(ext_rows, error_msgs, failed_rows)
+        else:
+            _logger.debug("Model 'products_ext.products_ext' not found. Skipping.")
+
+        # 5. 所有写入成功后才保存指纹，失败的行（包括新建后属性写入失败的）下次导入时会重新处理
+        succeeded = [(excel_row_num, vals) for excel_row_num, vals in rows if excel_row_num not in failed_rows]
+        if succeeded:
+            self._store_fingerprints([
+                (existing[vals['sku']].id, fingerprints[excel_row_num])
+                for excel_row_num, vals in succeeded
+            ])
+        stats['created'] += len(created_rows - failed_rows)
+        stats['updated'] += len(succeeded) - len(created_rows - failed_rows)
+
+        return len(rows) + len(unchanged_rows) - len(failed_rows)
+
+    def _store_fingerprints(self, product_fingerprints):
+        """ 用一条 UPDATE ... FROM (VALUES ...) 写入多个变体各自不同的指纹 """
+        Product = self.env['product.product']
+        Product.flush_model(['import_fingerprint'])
+        placeholders = ', '.join(['(%s, %s)'] * len(product_fingerprints))
+        params = [value for pair in product_fingerprints for value in pair]
+        self.env.cr.execute(f"""
+            UPDATE product_product AS p
+               SET import_fingerprint = v.fingerprint
+              FROM (VALUES {placeholders}) AS v(id, fingerprint)
+             WHERE p.id = v.id
+        """, params)
+        Product.browse([product_id for product_id, _fp in product_fingerprints]).invalidate_recordset(['import_fingerprint'])
+
+    def _sync_products_ext(self, ext_rows, error_msgs, failed_rows):
+        """ 批量同步报关扩展信息：一次读取分块内所有扩展记录，缺失的一次 create，变化的按相同值分组 write。
+        ext_rows 为 (excel_row_num, vals, product) 列表，出错的行号加入 failed_rows """
+        Ext = self.env['products_ext.products_ext']
+        ext_fields = ['product_url', 'declared_name_en', 'declared_name_cn', 'declared_price']
+        current = {}
+        with profiling.phase('lookup'):
+            for record in Ext.search_read([('product_id', 'in', [product.id for _r, _v, product in ext_rows])], ['product_id'] + ext_fields):
+                current.setdefault(record['product_id'][0], record)
+
+        to_create = []
+        writes = defaultdict(list)
+        row_by_ext_id = {}
+        for excel_row_num, vals, product in ext_rows:
+            decl_price_val_ext = vals['decl_price_ext']
+            if decl_price_val_ext is None:
+                msg = f"Row {excel_row_num} (SKU: {vals['sku']}): Invalid declared price '{vals['decl_price_ext_str']}'. Using 0.0."
+                error_msgs.append(msg)
+                _logger.warning(msg)
+                decl_price_val_ext = 0.0
+            ext_vals = {
+                'product_url': vals['product_url_ext'],
+                'declared_name_en': vals['decl_name_en_ext'],
+                'declared_name_cn': vals['decl_name_cn_ext'],
+                'declared_price': decl_price_val_ext,
+            }
+            record = current.get(product.id)
+            if not record:
+                to_create.append((excel_row_num, vals['sku'], dict(ext_vals, product_id=product.id)))
+                continue
+            # 未设置的 Char 字段读出为 False，按空字符串比较
+            changed = {
+                field: value for field, value in ext_vals.items()
+                if (record[field] if field == 'declared_price' else record[field] or '') != value
+            }
+            if changed:
+                writes[tuple(sorted(changed.items()))].append(record['id'])
+                row_by_ext_id[record['id']] = (excel_row_num, vals['sku'])
+
+        if to_create:
+            try:
+                with self.env.cr.savepoint():
+                    Ext.create([create_vals for _r, _s, create_vals in to_create])
+            except Exception as e_create:
+                _logger.warning(f"Bulk create of {len(to_create)} products_ext records failed, retrying row by row: {e_create}")
+                for excel_row_num, sku, create_vals in to_create:
+                    try:
+                        with self.env.cr.savepoint():
+                            Ext.create(create_vals)
+                    except Exception as e_row:
+                        msg = f"Row {excel_row_num} (SKU: {sku}): Processing error: {str(e_row)}"
+                        error_msgs.append(msg)
+                        _logger.error(msg)
+                        failed_rows.add(excel_row_num)
+
+        for write_key, record_ids in writes.items():
+            records = Ext.browse(record_ids)
+            try:
+                with self.env.cr.savepoint():
+                    records.write(dict(write_key))
+            except Exception as e_write:
+                _logger.warning(f"Grouped write of {len(records)} products_ext records failed, retrying one by one: {e_write}")
+                for record in records:
+                    excel_row_num, sku = row_by_ext_id[record.id]
+                    try:
+                        with self.env.cr.savepoint():
+                            record.write(dict(write_key))
+                    except Exception as e_row:
+                        msg = f"Row {excel_row_num} (SKU: {sku}): Processing error: {str(e_row)}"
+                        error_msgs.append(msg)
+                        _logger.error(msg)
+                        failed_rows.add(excel_row_num)
+
+
+class ProductImportJobChunk(models.Model):
+    """ 预扫描读取的一个文件分块：提取后的行（gzip JSON 的 [excel_row_num, vals] 列表）。
+    每个分块单独提交，预扫描被中断后从最后保存的分块之后继续 """
+    _name = 'product.import.job.chunk'
+    _description = 'Product Import Job Scanned Chunk'
+    _order = 'job_id, first_row'
+
+    job_id = fields.Many2one('product.import.job', string="Import Job", required=True, index=True, ondelete='cascade')
+    partition_index = fields.Integer("Partition", default=0, help="Partition job that imports these rows when the job runs with several workers.")
+    first_row = fields.Integer("First Row", required=True)
+    last_row = fields.Integer("Last Row", required=True)
+    row_count = fields.Integer("Rows")
+    data = fields.Binary("Rows Data", attachment=False)
+
+
+class ProductImportJobCancel(models.Model):
+    """ 导入任务的取消请求。与任务分表保存：界面登记请求时不会修改处理中的任务行 """
+    _name = 'product.import.job.cancel'
+    _description = 'Product Import Job Cancellation Request'
+
+    job_id = fields.Many2one('product.import.job', string="Import Job", required=True, index=True, ondelete='cascade')
+
+    _sql_constraints = [
+        ('job_uniq', 'unique (job_id)', "A cancellation is already requested for this import job."),
+    ]
@@ -1,4 +1,8 @@
-from odoo import models, fields
+import json
+
+from odoo import api, models, fields
+
+from ..tools import profiling
 
 class ProductImportLog(models.Model):
     _name = "product.import.log"
@@ -30,8 +34,29 @@ class ProductImportLog(models.Model):
         ('kaola', '考拉海购'),
         ], string="Platform", required=True, help="Select the platform import template for product import.")
     default_stock_location = fields.Many2one('stock.location', string="Default Stock Location", required=True)
-    import_file = fields.Binary("Import File", required=True, attachment=True)
+    import_file_id = fields.Many2one('product.import.file', string="Import File Record", index=True, ondelete='set null',
+        help="Uploaded file, shared by all imports of the same content. Removed after the retention period.")
+    import_file = fields.Binary(related='import_file_id.file', string="Import File")
     total = fields.Integer("Total Rows")
     success = fields.Integer("Success Rows")
     failed = fields.Integer("Failed Rows")
+    created = fields.Integer("Created Rows")
+    updated = fields.Integer("Updated Rows")
+    unchanged = fields.Integer("Unchanged Rows")
+    collapsed = fields.Integer("Collapsed Rows", help="Rows merged into another row with the same SKU.")
+    archived = fields.Integer("Archived Products", help="Products archived because their SKU was no longer in the file.")
     message = fields.Text("Message")
+    duration = fields.Float("Processing Time (s)", digits=(16, 1), help="Sum of the time spent in all import phases, excluding time waiting in the queue.")
+    query_count = fields.Integer("SQL Queries")
+    memory_growth_mb = fields.Float("Memory Growth (MB)", digits=(16, 1), help="Largest growth of the worker's resident memory while the import ran.")
+    phase_stats = fields.Text("Phase Statistics", help="JSON: wall time, SQL queries and rows per import phase.")
+    phase_summary = fields.Text("Performance", compute='_compute_phase_summary')
+    slow_rows = fields.Text("Slowest Rows", help="JSON list of the slowest rows recorded in debug mode.")
+    row_hashes = fields.Binary("Row Hashes", attachment=True,
+        help="gzip JSON {SKU: fingerprint} of the rows applied by this import. The latest successful import of a platform "
+             "keeps it as the baseline of the next incremental import.")
+
+    @api.depends('phase_stats', 'slow_rows')
+    def _compute_phase_summary(self):
+        for log in self:
+            log.phase_summary = profiling.format_report(json.loads(log.phase_stats or '{}'), json.loads(log.slow_rows or '[]'))
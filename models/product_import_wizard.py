@@ -1,24 +1,37 @@
-import warnings
-# 屏蔽 openpyxl 在读取没有默认样式的 Excel 文件时产生的特定用户警告
-warnings.filterwarnings("ignore", category=UserWarning, module="openpyxl", message="Workbook contains no default style, apply openpyxl's default")
 import base64
-import tempfile
 import binascii
+import csv
+import hashlib
+import io
 import logging
-import pandas as pd
-import os # 用于删除临时文件
-import psycopg2 
+import time
+from collections import Counter
 
 from odoo import models, fields, api, _
 from odoo.exceptions import UserError
 
+from ..tools import fingerprint, mapping_profiles, spreadsheet_reader
+from .product_template_image_url import is_valid_url
+
 _logger = logging.getLogger(__name__)
 
+# 预检时每次读取与查询的行数
+VALIDATION_CHUNK_SIZE = 5000
+# 预检在请求中同步执行，报告也在内存中生成；超过该行数的文件应直接导入（后台任务会在日志中记录同样的问题）
+VALIDATION_MAX_ROWS = 20000
+# 预检报告中检查的数值字段：(字段, 问题描述)
+VALIDATION_NUMERIC_FIELDS = (
+    ('weight', 'Invalid weight'),
+    ('cost_price', 'Invalid cost price'),
+    ('decl_price_ext', 'Invalid declared price'),
+)
+
 class ProductImportWizard(models.TransientModel):
     _name = 'product.import.wizard'
     _description = 'Product Import Wizard'
 
-    file = fields.Binary(string='Upload Excel File', required=True, help="Upload an Excel file (.xls or .xlsx) for product import.")
+    # 向导只临时持有上传内容（不建附件），任务与日志引用按内容哈希保存的 product.import.file
+    file = fields.Binary(string='Upload Excel File', required=True, attachment=False, help="Upload an Excel file (.xls or .xlsx) for product import.")
     filename = fields.Char(string='Filename')
     platform = fields.Selection([
         ('dianxiaomi', '店小秘'),
@@ -40,327 +53,207 @@ class ProductImportWizard(models.TransientModel):
         ('suning', '苏宁易购'),
     ], string='Platform')
     default_stock_location = fields.Many2one('stock.location', string='Default Stock Location', required=True, help="Default stock location for imported products.")
+    import_mode = fields.Selection([
+        ('bulk', 'Bulk Upsert'),
+        ('row', 'Row by Row'),
+    ], string='Import Mode', default='bulk', required=True,
+        help="Bulk Upsert resolves SKUs per chunk and creates/writes products in batches; Row by Row processes one row at a time.")
+    worker_count = fields.Integer(string='Workers', default=lambda self: self._default_worker_count(),
+        help="Number of parallel import workers. Rows are partitioned by a hash of the SKU.")
+    duplicate_policy = fields.Selection([
+        ('last', 'Last Row Wins'),
+        ('first_non_empty', 'First Non-Empty Value Wins'),
+        ('reject', 'Reject as Error'),
+    ], string='Duplicate SKUs', default='last', required=True,
+        help="How rows sharing the same SKU in the file are handled: only one upsert is made per SKU, "
+             "using the last row, or for each column the first non-empty value; or all these rows are rejected.")
+    import_scope = fields.Selection([
+        ('full', 'Full File'),
+        ('delta', 'Changed Rows Only'),
+    ], string='Import Scope', default='full', required=True,
+        help="Changed Rows Only compares each row with the previous successful import of this platform and imports only new "
+             "and changed SKUs, so products edited in Odoo since then are not re-imported. Full File re-imports them: "
+             "editing an imported field (name, SKU, image URL, weight, cost, stock location) in Odoo clears the product's "
+             "import fingerprint. Declared customs values edited in Odoo are not detected.")
+    archive_missing = fields.Boolean(string='Archive Missing SKUs',
+        help="Archive the products whose SKU was in the previous successful import of this platform but is no longer in the file.")
+    reimport_identical = fields.Boolean(string='Re-import Identical File',
+        help="Import the file even if a file with exactly the same content was already imported for this platform and location.")
+    debug_slow_rows = fields.Integer(string='Record Slowest Rows', default=0,
+        help="Debug mode: record the N slowest rows with their SKU in the import log. "
+             "Only rows imported one at a time (Row by Row mode) are timed. 0 disables it.")
 
-    def _get_cell_value(self, row_list, col_idx, default_value=''):
-        """ 安全地从列表（Excel行）中获取单元格值 """
-        try:
-            # pandas 读取空单元格可能为 NaN (float)，需要转换为字符串并处理
-            val_raw = row_list[col_idx]
-            if pd.isna(val_raw): # 处理 NaN 值
-                return default_value
-            val_str = str(val_raw).strip()
-            # 进一步处理 pandas 自动转换的 '.0' 后缀（针对看起来像数字的字符串）
-            if val_str.endswith('.0') and val_str[:-2].isdigit():
-                val_str = val_str[:-2]
-            return val_str if val_str else default_value
-        except IndexError:
-            return default_value
-        except Exception as e: # 其他潜在转换错误
-            _logger.warning(f"Could not process cell value at col {col_idx} (value: {row_list[col_idx] if col_idx < len(row_list) else 'OOB'}): {e}")
-            return default_value
+    validation_summary = fields.Text(string='Validation Summary', readonly=True)
+    validation_report = fields.Binary(string='Validation Report', readonly=True, attachment=False)
+    validation_report_name = fields.Char(string='Validation Report Name')
 
-    def action_import_products(self):
+    @api.model
+    def _default_worker_count(self):
+        return int(self.env['ir.config_parameter'].sudo().get_param('product_excel_import_advanced.import_worker_count', 1))
+
+    def _decode_upload(self):
+        """ 检查上传的文件与平台，返回解码后的文件内容 """
         self.ensure_one()
         if not self.file:
             raise UserError(_("Please upload an Excel file."))
 
-        wizard_filename = self.filename # 将 filename 存储在局部变量中
-
         # check the platform is valid
         if self.platform not in dict(self._fields['platform'].selection).keys():
             raise UserError(_("Invalid platform selected."))
         
-        # check the working platform is valid
-        if self.platform not in ['dianxiaomi', 'mabangerp']:
+        # check the working platform is valid (a column mapping profile exists)
+        if self.platform not in mapping_profiles.PROFILES:
             raise UserError(_("Invalid platform selected."))
 
         try:
-            file_data = base64.b64decode(self.file)
+            content = base64.b64decode(self.file)
         except binascii.Error:
             raise UserError(_("Invalid file format. The uploaded file could not be decoded."))
+        return content
 
-        products_data = []
-        tmp_path = None
-        error_msgs = []
-
-        try:
-            with tempfile.NamedTemporaryFile(delete=False, suffix=".xlsx") as tmp:
-                tmp.write(file_data)
-                tmp_path = tmp.name
-            
-            if self.platform == 'shopify':
-                # shopify is a csv file
-                with open(tmp_path, 'r', encoding='utf-8') as csvfile:
-                    reader = csv.reader(csvfile)
-                    header = next(reader, None)
-                    for idx, row in enumerate(reader):
-                        excel_row_num = idx + 2
-                        sku_val = row[0] if len(row) > 0 else ''
-                        if not sku_val:
-                            msg = f"Row {excel_row_num}: SKU is empty, skipping this row."
-                            error_msgs.append(msg)
-                            _logger.warning(msg)
-                            continue
-                        products_data.append((excel_row_num, row))
-            else:
-                df = pd.read_excel(tmp_path, header=0, engine=None, dtype=str)
-                _logger.info(f"Excel columns found: {df.columns.tolist()}")
-
-                for idx, row_series in df.iterrows():
-                    values = row_series.tolist()
-                    excel_row_num = idx + 2
-                    sku_val = self._get_cell_value(values, 0)
-                    if not sku_val:
-                        msg = f"Row {excel_row_num}: SKU is empty, skipping this row."
-                        error_msgs.append(msg)
-                        _logger.warning(msg)
-                        continue
-                    products_data.append((excel_row_num, values))
-        except Exception as e:
-            _logger.error(f"Failed to read or process Excel file: {e}", exc_info=True)
-            raise UserError(_("Failed to read or process the Excel file. Error: %s") % str(e))
-        finally:
-            if tmp_path and os.path.exists(tmp_path):
-                try:
-                    os.unlink(tmp_path)
-                except Exception as e_unlink:
-                    _logger.warning(f"Could not delete temporary file {tmp_path}: {e_unlink}")
-        
-        if not products_data:
-            _logger.info("No valid product data found in the Excel file to import.")
-            if error_msgs:
-                 return self._import_result(wizard_filename, 0, 0, error_msgs)
-            raise UserError(_("No valid product data found in the uploaded Excel file."))
-
-        total_to_process = len(products_data)
-        successful_imports = 0
-        # error_msgs 已经在上面初始化，这里不需要再次初始化
-
-        BATCH_SIZE = 20 
-        _logger.info(f"Starting product import. Total valid rows: {total_to_process}, Batch size: {BATCH_SIZE}")
+    def action_import_products(self):
+        """ 创建后台导入任务并立即返回，由 cron 分块处理文件 """
+        content = self._decode_upload()
 
-        for loop_idx, (excel_row_num, row_values) in enumerate(products_data, 1):
-            try:
-                # _logger.debug(f"Current cursor state before processing row {excel_row_num}: {self.env.cr.closed if self.env.cr else 'No cursor'}")
-                
-                
+        if self.worker_count < 1:
+            raise UserError(_("The number of workers must be at least 1."))
+        if self.debug_slow_rows < 0:
+            raise UserError(_("The number of slowest rows to record cannot be negative."))
 
-                if self.platform == 'dianxiaomi':
-                    sku = self._get_cell_value(row_values, 0)
-                    product_name_cn = self._get_cell_value(row_values, 2)
-                    product_name_en = self._get_cell_value(row_values, 3)
-                    #product_name = product_name_en or product_name_cn or sku
-                    product_name = product_name_en + product_name_cn + sku
-                    # 图片处理
-                    image_url = self._get_cell_value(row_values, 6)
-                    # 报关数据处理
-                    product_url_ext = self._get_cell_value(row_values, 13)
-                    decl_name_en_ext = self._get_cell_value(row_values, 15)
-                    decl_name_cn_ext = self._get_cell_value(row_values, 16)
-                    decl_price_str_ext = self._get_cell_value(row_values, 18, '0.0')
+        # 相同内容的文件已导入（或正在导入）时，在解析之前直接拦截
+        if not self.reimport_identical:
+            previous = self.env['product.import.job'].search([
+                ('import_file_id.checksum', '=', hashlib.sha1(content).hexdigest()),
+                ('platform', '=', self.platform),
+                ('default_stock_location', '=', self.default_stock_location.id),
+                ('parent_id', '=', False),
+                ('state', 'in', ('queued', 'running', 'done')),
+            ], limit=1)
+            if previous.state == 'done':
+                raise UserError(_("This file was already imported by job '%(job)s' on %(date)s. "
+                                  "Select 'Re-import Identical File' to import it again.",
+                                  job=previous.name, date=previous.date_finished))
+            if previous:
+                raise UserError(_("This file is already being imported by job '%(job)s'.", job=previous.name))
 
-                elif self.platform == 'mabangerp':
-                    sku = self._get_cell_value(row_values, 0)
-                    product_name_cn = self._get_cell_value(row_values, 2)
-                    product_name_en = self._get_cell_value(row_values, 3)
-                    # product name include en and cn and sku
-                    product_name = product_name_en + product_name_cn + sku
+        import_file = self.env['product.import.file']._get_or_create(content, self.filename)
+        job = self.env['product.import.job'].create({
+            'name': self.filename or f"Product Import @ {fields.Datetime.now(self)}",
+            'filename': self.filename,
+            'platform': self.platform,
+            'default_stock_location': self.default_stock_location.id,
+            'import_mode': self.import_mode,
+            'worker_count': self.worker_count,
+            'debug_slow_rows': self.debug_slow_rows,
+            'duplicate_policy': self.duplicate_policy,
+            'import_scope': self.import_scope,
+            'archive_missing': self.archive_missing,
+            'import_file_id': import_file.id,
+        })
+        job._trigger_cron()
+        _logger.info(f"Queued product import job {job.id} ({job.name}), mode: {job.import_mode}, scope: {job.import_scope}, workers: {job.worker_count}")
 
-                    #product_name = product_name_en or product_name_cn or sku
+        return {
+            'type': 'ir.actions.act_window',
+            'name': _('Product Import Job'),
+            'res_model': 'product.import.job',
+            'res_id': job.id,
+            'view_mode': 'form',
+            'target': 'current',
+        }
 
-                    # 图片处理
-                    image_url = self._get_cell_value(row_values, 12) 
-                    # 报关数据处理
-                    product_url_ext = self._get_cell_value(row_values, 11)
-                    decl_name_en_ext = self._get_cell_value(row_values, 4)
-                    decl_name_cn_ext = self._get_cell_value(row_values, 5)
-                    decl_price_str_ext = self._get_cell_value(row_values, 6, '0.0')
-                elif self.platform == 'shopify':
-                    sku = self._get_cell_value(row_values, 17)
-                    product_name_cn = self._get_cell_value(row_values, 2)
-                    product_name_en = self._get_cell_value(row_values, 3)
-                    # product name include en and cn and sku
-                    product_name = product_name_en + product_name_cn + sku
+    def action_validate_products(self):
+        """ 只预检文件，不写入产品：统计将新建/更新/不变的行数与数据问题，生成逐行的 CSV 报告 """
+        content = self._decode_upload()
+        if spreadsheet_reader.estimate_row_count(content) > VALIDATION_MAX_ROWS:
+            self._raise_validation_too_large()
+        start = time.monotonic()
+        try:
+            profile = mapping_profiles.compile_profile(self.platform, spreadsheet_reader.read_header(content))
+        except ValueError as e:
+            raise UserError(str(e))
+        counts, report = self._validate_rows(content, profile)
+        elapsed = time.monotonic() - start
 
-                    #product_name = product_name_en or product_name_cn or sku
+        summary = [
+            _("Rows: %s (validated in %.1fs)", counts['rows'], elapsed),
+            _("To create: %s, to update: %s, unchanged: %s", counts['create'], counts['update'], counts['unchanged']),
+            _("Empty SKU: %s", counts['Empty SKU']),
+            _("Duplicate SKU rows: %s", counts['Duplicate SKU']),
+        ]
+        summary += [_("%s: %s", label, counts[label]) for _field, label in VALIDATION_NUMERIC_FIELDS]
+        summary.append(_("Malformed image URL: %s", counts['Malformed image URL']))
+        _logger.info(f"Validated product import file {self.filename} in {elapsed:.1f}s: {dict(counts)}")
 
-                    # 图片处理
-                    image_url = self._get_cell_value(row_values, 6) 
-                    # 报关数据处理
-                    product_url_ext = self._get_cell_value(row_values, 13)
-                    decl_name_en_ext = self._get_cell_value(row_values, 15)
-                    decl_name_cn_ext = self._get_cell_value(row_values, 16)
-                    decl_price_str_ext = self._get_cell_value(row_values, 18, '0.0')
-                else: # 默认处理方式 店小蜜
-                    sku = self._get_cell_value(row_values, 0)
-                    product_name_cn = self._get_cell_value(row_values, 2)
-                    product_name_en = self._get_cell_value(row_values, 3)
-                    product_name = product_name_en or product_name_cn or sku
-                    image_url = self._get_cell_value(row_values, 6)
-                    product_url_ext = self._get_cell_value(row_values, 13)
-                    decl_name_en_ext = self._get_cell_value(row_values, 15)
-                    decl_name_cn_ext = self._get_cell_value(row_values, 16)
-                    decl_price_str_ext = self._get_cell_value(row_values, 18, '0.0')
+        self.write({
+            'validation_summary': '\n'.join(summary),
+            'validation_report': base64.b64encode(report.encode('utf-8-sig')),
+            'validation_report_name': f"{(self.filename or 'import').rsplit('.', 1)[0]}_validation.csv",
+        })
+        return {
+            'type': 'ir.actions.act_window',
+            'name': _('Import Products'),
+            'res_model': self._name,
+            'res_id': self.id,
+            'view_mode': 'form',
+            'target': 'new',
+        }
 
-                _logger.info(f"Processing Excel row {excel_row_num}, SKU: {sku}")
-                #print(f"Processing Excel row {excel_row_num}, SKU: {sku}")
-                
-                # 核心改动点：在可能导致游标关闭的 commit 操作之后，这里的 search 需要特别小心
-                # 尝试在 search 前确保游标是活动的，或者让 Odoo ORM 自己处理
-                # 如果之前的 commit 导致游标关闭，Odoo 在执行新的SQL时应该会尝试获取新游标
-                product = self.env['product.product'].search([('default_code', '=', sku)], limit=1)
-                product_tmpl = None
+    def _raise_validation_too_large(self):
+        raise UserError(_(
+            "The file has more than %s rows, which is too many to validate while you wait. "
+            "Import it instead: the import runs in the background and reports empty or duplicate SKUs "
+            "and invalid values in its log.", VALIDATION_MAX_ROWS))
 
-                if not product:
-                    product_tmpl_vals = {
-                        'name': product_name,
-                        'default_code': sku,
-                        'detailed_type': 'product',
-                    }
-                    if(self.default_stock_location):
-                        product_tmpl_vals['property_stock_inventory'] = self.default_stock_location.id
-                    product_tmpl = self.env['product.template'].create(product_tmpl_vals)
-                    product = product_tmpl.product_variant_ids[:1]
-                    if not product:
-                        msg = f"Row {excel_row_num} (SKU: {sku}): Failed to create product variant."
-                        error_msgs.append(msg)
-                        _logger.error(msg)
-                        continue
-                    _logger.info(f"Row {excel_row_num}: Created product '{product.name}' (ID: {product.id}) for SKU {sku}")
-                else:
-                    product_tmpl = product.product_tmpl_id
-                    if product_tmpl.name != product_name:
-                        product_tmpl.write({'name': product_name})
-                        _logger.info(f"Row {excel_row_num}: Updated name for SKU {sku} to '{product_name}'")
-                    # 更新库存位置
-                    if self.default_stock_location and product_tmpl.property_stock_inventory != self.default_stock_location:
-                        product_tmpl.property_stock_inventory = self.default_stock_location
-                
-                
-                if image_url and image_url.startswith(('http://', 'https://')):
-                    if product_tmpl.image_url != image_url:
-                        product_tmpl.image_url = image_url
-                        _logger.info(f"Row {excel_row_num}: Set image_url for SKU {sku} to {image_url}")
+    def _validate_rows(self, source, profile):
+        """ 按分块读取并预检所有行，每个分块只做一次批量查询。返回 (计数, CSV 报告文本) """
+        Product = self.env['product.product']
+        location_id = self.default_stock_location.id
+        has_ext = 'products_ext.products_ext' in self.env
+        counts = Counter()
+        first_row_by_sku = {}
+        buffer = io.StringIO()
+        writer = csv.writer(buffer)
+        writer.writerow(['Row', 'SKU', 'Action', 'Issues'])
 
-                weight_str = self._get_cell_value(row_values, 7, '0.0')
-                cost_price_str = self._get_cell_value(row_values, 8, '0.0')
-                
-                try:
-                    weight_val = float(weight_str)
-                    if product_tmpl.weight != weight_val: product_tmpl.weight = weight_val
-                except ValueError:
-                    msg = f"Row {excel_row_num} (SKU: {sku}): Invalid weight value '{weight_str}'."
-                    error_msgs.append(msg)
-                    _logger.warning(msg)
-                
-                try:
-                    cost_price_val = float(cost_price_str)
-                    if product.standard_price != cost_price_val: product.standard_price = cost_price_val
-                except ValueError:
-                    msg = f"Row {excel_row_num} (SKU: {sku}): Invalid cost price value '{cost_price_str}'."
-                    error_msgs.append(msg)
-                    _logger.warning(msg)
+        for chunk in spreadsheet_reader.iter_row_chunks(source, chunk_size=VALIDATION_CHUNK_SIZE):
+            rows = profile.extract(chunk)
+            skus = list({vals['sku'] for _excel_row_num, vals in rows if vals['sku'] and vals['sku'] not in first_row_by_sku})
+            # 一次查询本分块中尚未见过的 SKU 的现有产品与指纹
+            existing = {}
+            for product in Product.search_read([('default_code', 'in', skus)], ['default_code', 'import_fingerprint'], order='id'):
+                existing.setdefault(product['default_code'], product['import_fingerprint'])
 
-                if 'products_ext.products_ext' in self.env:
-                    
-                    try:
-                        decl_price_val_ext = float(decl_price_str_ext)
-                    except ValueError:
-                        msg = f"Row {excel_row_num} (SKU: {sku}): Invalid declared price '{decl_price_str_ext}'. Using 0.0."
-                        error_msgs.append(msg)
-                        _logger.warning(msg)
-                        decl_price_val_ext = 0.0
-                    
-                    ext_record = self.env['products_ext.products_ext'].search([('product_id', '=', product.id)], limit=1)
-                    ext_vals = {
-                        'product_url': product_url_ext,
-                        'declared_name_en': decl_name_en_ext,
-                        'declared_name_cn': decl_name_cn_ext,
-                        'declared_price': decl_price_val_ext,
-                    }
-                    if not ext_record:
-                        ext_vals['product_id'] = product.id
-                        self.env['products_ext.products_ext'].create(ext_vals)
-                    else:
-                        ext_record.write(ext_vals)
+            # 没有 dimension 信息的 xlsx 无法预先估算行数，读取时再检查
+            if counts['rows'] + len(rows) > VALIDATION_MAX_ROWS:
+                self._raise_validation_too_large()
+            for excel_row_num, vals in rows:
+                counts['rows'] += 1
+                sku = vals['sku']
+                issues = []
+                if not sku:
+                    issues.append('Empty SKU')
+                    counts['Empty SKU'] += 1
+                    action = 'skip'
+                elif sku in first_row_by_sku:
+                    issues.append(f"Duplicate SKU (first on row {first_row_by_sku[sku]})")
+                    counts['Duplicate SKU'] += 1
+                    action = 'reject' if self.duplicate_policy == 'reject' else 'collapse'
+                elif sku in existing:
+                    unchanged = existing[sku] == fingerprint.row_fingerprint(vals, location_id, has_ext)
+                    action = 'unchanged' if unchanged else 'update'
                 else:
-                    _logger.debug("Model 'products_ext.products_ext' not found. Skipping.")
-
-                successful_imports += 1
-            except psycopg2.Error as e_db_row: # Catch psycopg2 errors specifically
-                msg = f"Row {excel_row_num} (SKU: {self._get_cell_value(row_values, 0, 'N/A')}): Database error: {str(e_db_row)}"
-                error_msgs.append(msg)
-                _logger.error(msg, exc_info=True)
-                # If a db error occurs, the transaction might be aborted, and cursor closed.
-                # It's safer to stop and report.
-                error_msgs.append("CRITICAL: Database error occurred. Import stopped to prevent further issues.")
-                return self._import_result(wizard_filename, total_to_process, successful_imports, error_msgs)
-            except Exception as e_row:
-                msg = f"Row {excel_row_num} (SKU: {self._get_cell_value(row_values, 0, 'N/A')}): Processing error: {str(e_row)}"
-                error_msgs.append(msg)
-                _logger.error(msg, exc_info=True)
-                continue
-
-            if loop_idx % BATCH_SIZE == 0:
-                _logger.info(f"Attempting to commit batch at loop_idx {loop_idx} (Excel row {excel_row_num})")
-                try:
-                    self.env.cr.commit() # Commit the transaction
-                    self.env.invalidate_all() # Invalidate cache
-                    # After commit, the cursor is closed. Odoo should handle getting a new one for the next operation.
-                    # No need to explicitly re-wrap self.env with self.with_env here for basic operations.
-                    # If issues persist, this is an area to revisit.
-                    _logger.info(f"Committed batch. Last processed Excel row: {excel_row_num}")
-                except psycopg2.Error as e_commit_db: # Catch psycopg2 errors specifically during commit
-                    _logger.error(f"CRITICAL: Database error during commit at batch {loop_idx} (Excel row {excel_row_num}): {e_commit_db}", exc_info=True)
-                    error_msgs.append(f"CRITICAL: DB commit failed at batch {loop_idx}. Import stopped. Error: {e_commit_db}")
-                    return self._import_result(wizard_filename, total_to_process, successful_imports, error_msgs)
-                except Exception as e_commit:
-                    _logger.error(f"CRITICAL: Error committing transaction at batch {loop_idx} (Excel row {excel_row_num}): {e_commit}", exc_info=True)
-                    error_msgs.append(f"CRITICAL: Commit failed at batch {loop_idx}. Import stopped. Error: {e_commit}")
-                    return self._import_result(wizard_filename, total_to_process, successful_imports, error_msgs)
-        
-        # Final commit for any remaining records
-        # Check if there are records processed since the last batch commit OR if total is less than BATCH_SIZE
-        if total_to_process > 0 and (loop_idx % BATCH_SIZE != 0 or total_to_process < BATCH_SIZE) :
-             _logger.info(f"Attempting final commit for remaining records. Loop index: {loop_idx}, Total processed: {successful_imports}")
-             try:
-                self.env.cr.commit()
-                self.env.invalidate_all()
-                _logger.info("Final commit successful.")
-             except psycopg2.Error as e_final_db:
-                _logger.error(f"CRITICAL: Database error during final commit: {e_final_db}", exc_info=True)
-                error_msgs.append(f"CRITICAL: DB error during final commit. Error: {e_final_db}")
-             except Exception as e_final_commit:
-                _logger.error(f"CRITICAL: Error during final commit: {e_final_commit}", exc_info=True)
-                error_msgs.append(f"CRITICAL: Error during final commit. Error: {e_final_commit}")
-
-        _logger.info(f"Product import finished. Total rows: {total_to_process}, Successful: {successful_imports}, Errors/Skipped: {len(error_msgs)}")
-        return self._import_result(wizard_filename,total_to_process, successful_imports, error_msgs)
-
-
-    def _import_result(self, import_filename, total_rows, success_count, error_list):
-        try:
-            log_message = '\n'.join(error_list)
-            self.env['product.import.log'].create({
-                'name': import_filename or f"Product Import @ {fields.Datetime.now(self)}",
-                'total': total_rows,
-                'success': success_count,
-                'failed': total_rows - success_count,
-                'platform': self.platform,
-                'default_stock_location': self.default_stock_location.id if self.default_stock_location else False,
-                'import_file': self.file,
-                'message': log_message,
-            })
-            _logger.info("Import log record created.")
-        except psycopg2.Error as log_db_e: # Catch specific DB error for logging
-             _logger.error(f"CRITICAL: Database error while creating import log: {log_db_e}", exc_info=True)
-        except Exception as log_e:
-            _logger.error(f"CRITICAL: Failed to create import log record: {log_e}", exc_info=True)
-        
-        return {
-            'type': 'ir.actions.act_window',
-            'name': _('Product Import Logs'),
-            'res_model': 'product.import.log',
-            'view_mode': 'tree,form',
-            'target': 'current',
-        }
+                    action = 'create'
+                if sku:
+                    first_row_by_sku.setdefault(sku, excel_row_num)
+                for field, label in VALIDATION_NUMERIC_FIELDS:
+                    if vals[field] is None:
+                        issues.append(f"{label} '{vals[field + '_str']}'")
+                        counts[label] += 1
+                image_url = vals['image_url']
+                if image_url and not (image_url.startswith(('http://', 'https://')) and is_valid_url(image_url)):
+                    issues.append(f"Malformed image URL '{image_url}'")
+                    counts['Malformed image URL'] += 1
+                counts[action] += 1
+                writer.writerow([excel_row_num, sku, action, '; '.join(issues)])
+        return counts, buffer.getvalue()
@@ -1,12 +1,167 @@
 import requests
 import base64
 import logging
+import multiprocessing
+import runpy
 import socket
+import threading
+import time
+from collections import Counter, defaultdict
+from datetime import timedelta
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor, TimeoutError as FuturesTimeoutError, as_completed
+from concurrent.futures.process import BrokenProcessPool
 from urllib.parse import urlparse
+from requests.adapters import HTTPAdapter
 from odoo import api, SUPERUSER_ID, models, fields, _
+from odoo.tools import config
+
+from ..tools import image_processing, profiling
+from ..tools.lru_cache import ByteBudgetLRU
+from ..tools.time_budget import cron_time_budget
 
 _logger = logging.getLogger(__name__)
 
+# 限制最大图片为10MB
+MAX_IMAGE_SIZE = 10 * 1024 * 1024
+# 产品的图片下载连续失败该次数后标记为失败，需要人工处理。URL 的重试按指数退避间隔，
+# 8 次尝试约覆盖两天，不会因 CDN 短暂故障在半小时内用完重试次数
+MAX_IMAGE_DOWNLOAD_ATTEMPTS = 8
+
+# 进程内图片内容缓存（按内容哈希），跨 cron 运行复用，总大小不超过 64MB
+_image_content_cache = ByteBudgetLRU(64 * 1024 * 1024)
+
+_http_session = None
+_http_session_lock = threading.Lock()
+
+_process_pool = None
+_process_pool_lock = threading.Lock()
+
+
+def _get_http_session(pool_size):
+    """ 进程内共享的 HTTP 会话，复用 keep-alive 连接 """
+    global _http_session
+    with _http_session_lock:
+        if _http_session is None:
+            session = requests.Session()
+            adapter = HTTPAdapter(pool_connections=pool_size, pool_maxsize=pool_size)
+            session.mount('http://', adapter)
+            session.mount('https://', adapter)
+            _http_session = session
+        return _http_session
+
+
+def _download_image(session, url, timeout, host_semaphore, etag=None, last_modified=None):
+    """ 在工作线程中下载图片，不访问 ORM，返回 (内容, ETag, Last-Modified)。失败时抛出异常。
+    传入 etag / last_modified 时发送条件请求，服务器返回 304 时内容为 None """
+    headers = {}
+    if etag:
+        headers['If-None-Match'] = etag
+    if last_modified:
+        headers['If-Modified-Since'] = last_modified
+    with host_semaphore:
+        response = session.get(url, timeout=timeout, stream=True, headers=headers)
+        try:
+            if response.status_code == 304:
+                return None, etag, last_modified
+            response.raise_for_status()
+            image_chunks = []
+            total_size = 0
+            for chunk in response.iter_content(chunk_size=8192):
+                if chunk:
+                    image_chunks.append(chunk)
+                    total_size += len(chunk)
+                    if total_size > MAX_IMAGE_SIZE:
+                        raise ValueError(f"Image too large: {total_size} bytes")
+            image_content = b"".join(image_chunks)
+            if not image_content:
+                raise ValueError("Empty image content")
+            return image_content, response.headers.get('ETag'), response.headers.get('Last-Modified')
+        finally:
+            response.close()
+
+
+def _get_process_pool(max_workers):
+    """ 进程内共享的图片处理进程池。使用 spawn 启动子进程，不继承 Odoo 进程的数据库连接与线程状态。
+    子进程不导入 Odoo 与本模块，只注册独立的图片处理模块（见 image_processing.load_standalone） """
+    global _process_pool
+    with _process_pool_lock:
+        if _process_pool is None:
+            _process_pool = ProcessPoolExecutor(
+                max_workers=max_workers,
+                mp_context=multiprocessing.get_context('spawn'),
+                initializer=runpy.run_path,
+                initargs=(image_processing.__file__, None, image_processing.POOL_INITIALIZER_RUN_NAME),
+            )
+        return _process_pool
+
+
+def _reset_process_pool(pool):
+    global _process_pool
+    with _process_pool_lock:
+        if _process_pool is pool:
+            _process_pool = None
+    pool.shutdown(wait=False)
+
+
+def _fetch_image(session, url, timeout, host_semaphore, process_pool, etag=None, last_modified=None):
+    """ 在工作线程中下载图片并在进程池中校验、缩放、重新编码，返回 (要保存的内容, 原始大小, ETag, Last-Modified)。
+    条件请求返回 304 时内容为 None。process_pool 为 None 时直接在当前线程中处理 """
+    image_content, etag, last_modified = _download_image(session, url, timeout, host_semaphore, etag, last_modified)
+    if image_content is None:
+        return None, 0, etag, last_modified
+    if process_pool:
+        try:
+            processed = process_pool.submit(image_processing.load_standalone().process_image, image_content).result()
+            return processed, len(image_content), etag, last_modified
+        except BrokenProcessPool:
+            _logger.warning("Image processing pool is broken, processing in the download thread.")
+            _reset_process_pool(process_pool)
+    return image_processing.process_image(image_content), len(image_content), etag, last_modified
+
+
+def _next_completed(completed, futures):
+    """ 返回 as_completed 的下一个完成的下载，全部完成时返回 None。
+    超过 as_completed 的等待时间时取消尚未开始的下载并返回 None，未完成的下载留在 futures 中 """
+    try:
+        return next(completed, None)
+    except FuturesTimeoutError:
+        for future in futures:
+            future.cancel()
+        _logger.warning(f"Image download time budget used up, leaving {len(futures)} unfinished downloads to the next run")
+        return None
+
+
+def _failure_status(error):
+    """ 失败对应的 HTTP 状态码，没有 HTTP 响应时为 0 """
+    response = getattr(error, 'response', None)
+    return response.status_code if response is not None else 0
+
+
+def _is_host_failure(error):
+    """ 连接失败、超时、限流（429）与服务端错误（5xx）说明域名本身有问题，计入熔断。
+    404 等客户端错误与内容错误（无效图片、图片过大、空内容等 ValueError）只影响单个 URL：
+    正常的 CDN 返回几个 HTML 占位页不应熔断整个域名 """
+    if isinstance(error, requests.exceptions.HTTPError):
+        status = _failure_status(error)
+        return status == 429 or status >= 500
+    if isinstance(error, (requests.exceptions.ConnectionError, requests.exceptions.Timeout)):
+        return True
+    if isinstance(error, requests.exceptions.RequestException):
+        return False
+    return isinstance(error, OSError)
+
+
+# 验证 URL 是否有效
+def is_valid_url(url):
+    parsed = urlparse(url)
+    return bool(parsed.netloc) and bool(parsed.scheme)
+
+
+def _is_downloadable_url(url):
+    """ cron 会下载的图片 URL：http(s) 且不指向本机 """
+    return bool(url) and url.startswith(('http://', 'https://')) and 'localhost' not in url and '127.0.0.1' not in url
+
+
 class ProductTemplate(models.Model):
     _inherit = 'product.template'
 
@@ -19,133 +174,368 @@ class ProductTemplate(models.Model):
     image_download_failed = fields.Boolean(
         string='Image Download Failed',
         default=False,
-        help="Indicates if the image download has failed 3 times and needs manual intervention."
+        help="Indicates if the image download has failed repeatedly (with exponential backoff between attempts) and needs manual intervention."
+    )
+    image_pending = fields.Boolean(
+        string='Image Download Pending',
+        default=False,
+        copy=False,
+        readonly=True,
+        help="Set when the image URL still has to be downloaded. Maintained by the importer and the image download cron."
+    )
+    image_priority = fields.Integer(
+        string='Image Download Priority',
+        default=0,
+        copy=False,
+        help="Pending images with a lower value are downloaded first. Every failed attempt adds 1."
     )
+    image_blob_id = fields.Many2one(
+        'product.image.blob',
+        string='Image Content',
+        readonly=True,
+        index=True,
+        ondelete='set null',
+        help="Content-addressed image shared by every product using the same image URL."
+    )
+
+    def init(self):
+        super().init()
+        # 待下载图片的部分索引：只包含 image_pending 的行，候选查询按 (优先级, id) 顺序走索引
+        self.env.cr.execute("""
+            CREATE INDEX IF NOT EXISTS product_template_image_pending_idx
+                ON product_template (image_priority, id)
+             WHERE image_pending
+        """)
+
+    @api.model_create_multi
+    def create(self, vals_list):
+        for vals in vals_list:
+            if 'image_pending' not in vals and vals.get('image_url'):
+                vals['image_pending'] = _is_downloadable_url(vals['image_url']) and not vals.get('image_1920')
+        return super().create(vals_list)
+
+    def write(self, vals):
+        explicit_pending = 'image_pending' in vals
+        if not explicit_pending and 'image_url' in vals:
+            # 新的图片 URL 重新开始下载，之前的失败次数清零
+            vals = dict(vals, image_pending=_is_downloadable_url(vals['image_url']), image_priority=0,
+                        image_download_fail_count=0, image_download_failed=False)
+        if not explicit_pending and vals.get('image_1920'):
+            # 手动上传了图片：不再下载，cron 不会覆盖用户的图片
+            vals = dict(vals, image_pending=False)
+        res = super().write(vals)
+        if 'image_pending' not in vals and (('image_1920' in vals and not vals['image_1920'])
+                                            or ('image_download_failed' in vals and not vals['image_download_failed'])):
+            # 清除了图片或重置了失败标记：重新排队下载
+            self.filtered(lambda tmpl: _is_downloadable_url(tmpl.image_url) and not tmpl.image_download_failed).write({'image_pending': True})
+        return res
+
+    def _register_image_failure(self):
+        self.ensure_one()
+        self.image_download_fail_count += 1
+        self.image_priority += 1
+        if self.image_download_fail_count >= MAX_IMAGE_DOWNLOAD_ATTEMPTS:
+            self.write({'image_download_failed': True, 'image_pending': False})
+            _logger.warning(f"Product ID {self.id} (SKU: {self.default_code}) marked as failed after {MAX_IMAGE_DOWNLOAD_ATTEMPTS} unsuccessful attempts.")
 
     @api.model
-    def cron_update_product_images(self, limit_per_run=20, download_timeout=60, commit_batch_size=10):
-        _logger.info(f"Starting cron_update_product_images: limit_per_run={limit_per_run}, commit_batch_size={commit_batch_size}")
+    def cron_update_product_images(self, time_budget=300, max_workers=8, per_host_limit=4, batch_size=50,
+                                   download_timeout=60, limit_per_run=None, process_workers=2, revalidate_days=7,
+                                   per_host_batch_limit=8):
+        """ 并发下载产品图片。
+
+        下载在线程池中并行执行（每个域名最多 ``per_host_limit`` 个并发请求，共享带连接池的会话），
+        每批中同一域名最多提交 ``per_host_batch_limit`` 个 URL，其余产品留到之后的批次，慢域名不会拖住整批；
+        下载的图片在 ``process_workers`` 个进程中校验、缩小到 1920px 并重新编码（为 0 时在下载线程中处理），
+        写入数据库仍在 cron 的游标上串行进行，事务中只处理已优化的图片，每批提交一次。
+        每次运行处理的数量由 ``time_budget``（秒）决定，``limit_per_run`` 仅作为可选的上限。
+        prefork 模式下预算会按 worker 的时间限制收紧，并为最后一批下载预留 ``download_timeout``；
+        预留时间也用完时不再等待未完成的下载，它们的产品留在队列中由下次运行处理。
+        下载失败的 URL 与域名状态在每次失败后立即提交，运行被中止时退避与熔断状态不会丢失。
+
+        每个 URL 的抓取状态保存在 product.image.source：失败的 URL 按指数退避等待重试，
+        连续失败的域名会被熔断一段时间。剩余的时间用于条件请求（ETag / Last-Modified）重新验证
+        超过 ``revalidate_days`` 天未检查的图片，供应商更换了图片时更新使用该 URL 的产品。
+        """
+        time_budget = cron_time_budget(time_budget, config, reserve=download_timeout)
+        _logger.info(f"Starting cron_update_product_images: time_budget={time_budget}s, max_workers={max_workers}, "
+                     f"per_host_limit={per_host_limit}, batch_size={batch_size}")
         Product = self.with_user(SUPERUSER_ID).env['product.template']
-        products_to_process = Product.search([
-            ('image_url', '!=', False),
-            ('image_url', 'not like', 'localhost'),
-            ('image_url', 'not like', '127.0.0.1'),
-            '|',
-            ('image_1920', '=', False),
-            ('image_1920', '=', b''),
-            ('image_download_failed', '=', False)
-        ], limit=limit_per_run)
-
-        if not products_to_process:
-            _logger.info("No products found requiring image download in this run.")
-            return True
-
-        _logger.info(f"Found {len(products_to_process)} products to attempt image download.")
+        session = _get_http_session(max_workers)
+        process_pool = _get_process_pool(process_workers) if process_workers else None
+        host_semaphores = defaultdict(lambda: threading.BoundedSemaphore(per_host_limit))
+        deadline = time.monotonic() + time_budget
+        # 等待下载的最晚时间：预算之外为最后一批预留的 download_timeout
+        wait_deadline = deadline + download_timeout
+        attempted_ids = set()
         processed_count = 0
         success_count = 0
+        skipped_count = 0
+        original_bytes = 0
+        stored_bytes = 0
+
+        ImageSource = Product.env['product.image.source']
+        # 有连续失败记录的域名，熔断中的域名本次运行不再访问
+        host_states = Product.env['product.image.host']._get_failing()
+        open_hosts = {name for name, host in host_states.items() if host._is_open()}
+
+        # 不使用 with：退出时不等待超时后仍在运行的下载线程
+        executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix='product_image')
+        try:
+            while time.monotonic() < deadline:
+                limit = batch_size
+                if limit_per_run:
+                    limit = min(limit, limit_per_run - processed_count)
+                    if limit <= 0:
+                        break
+                with profiling.phase('lookup'):
+                    products_to_process = Product.browse(Product._select_image_candidates(limit, attempted_ids))
+                if not products_to_process:
+                    break
 
-        image_url_cache = {}
-
-        for product in products_to_process:
-            processed_count += 1
-            image_content = None
-
-            # 验证 URL 是否有效
-            def is_valid_url(url):
-                parsed = urlparse(url)
-                return bool(parsed.netloc) and bool(parsed.scheme)
-
-            if not is_valid_url(product.image_url):
-                _logger.warning(f"Invalid URL for product ID {product.id}: {product.image_url}")
-                product.image_download_fail_count += 1
-                if product.image_download_fail_count >= 3:
-                    product.image_download_failed = True
-                continue
-
-            # 1. 优先查本地缓存
-            if product.image_url in image_url_cache:
-                image_content = image_url_cache[product.image_url]
-                _logger.info(f"Reusing cached image for product ID {product.id} (SKU: {product.default_code}) from URL: {product.image_url}")
-            else:
-                # 2. 查数据库是否有其它产品已下载该图片
-                other = Product.search([
-                    ('image_url', '=', product.image_url),
-                    ('image_1920', '!=', False),
-                    ('id', '!=', product.id)
-                ], limit=1)
-                if other and other.image_1920:
-                    image_content = base64.b64decode(other.image_1920)
-                    image_url_cache[product.image_url] = image_content
-                    _logger.info(f"Reusing DB image for product ID {product.id} (SKU: {product.default_code}) from URL: {product.image_url}")
-                else:
-                    # 3. 需要下载
+                _logger.info(f"Found {len(products_to_process)} products to attempt image download.")
+                attempted_ids.update(products_to_process.ids)
+                processed_count += len(products_to_process)
+
+                # 同一 URL 在本批次中只下载一次
+                products_by_url = defaultdict(lambda: Product)
+                for product in products_to_process:
+                    if not is_valid_url(product.image_url):
+                        _logger.warning(f"Invalid URL for product ID {product.id}: {product.image_url}")
+                        product._register_image_failure()
+                        continue
+                    products_by_url[product.image_url] |= product
+
+                # 1. 一次查询 URL 的抓取状态，已下载过的 URL 直接复用已保存的图片
+                with profiling.phase('lookup'):
+                    sources = ImageSource._get_by_url(products_by_url)
+                now = fields.Datetime.now()
+                futures = {}
+                host_counts = Counter()
+                for url, products in products_by_url.items():
+                    source = sources.get(url)
+                    blob = source.blob_id if source else None
+                    if blob:
+                        image_content = _image_content_cache.get(blob.checksum)
+                        if image_content is None:
+                            image_content = blob._get_content()
+                            _image_content_cache.put(blob.checksum, image_content)
+                        _logger.info(f"Reusing stored image {blob.checksum} for product IDs {products.ids} from URL: {url}")
+                        success_count += self._store_downloaded_image(products, blob, image_content)
+                        continue
+                    # 2. 失败后等待重试的 URL 与熔断中的域名跳过，不计入产品的失败次数
+                    host = urlparse(url).netloc.lower()
+                    if (source and source.next_retry_at and source.next_retry_at > now) or host in open_hosts:
+                        skipped_count += len(products)
+                        continue
+                    # 3. 本批次中该域名的 URL 已达上限时留到之后的批次（不计入已尝试）
+                    if host_counts[host] >= per_host_batch_limit:
+                        attempted_ids.difference_update(products.ids)
+                        processed_count -= len(products)
+                        continue
+                    host_counts[host] += 1
+                    # 4. 需要下载，提交到线程池并行执行
+                    futures[executor.submit(_fetch_image, session, url, download_timeout, host_semaphores[host], process_pool)] = url
+
+                completed = as_completed(futures, timeout=max(0.0, wait_deadline - time.monotonic()))
+                while True:
+                    # 等待下载完成的时间计入 download 阶段
+                    with profiling.phase('download'):
+                        future = _next_completed(completed, futures)
+                    if future is None:
+                        break
+                    url = futures.pop(future)
+                    products = products_by_url[url]
                     try:
-                        _logger.info(f"Attempting to download image for product ID {product.id} (SKU: {product.default_code}) from URL: {product.image_url}")
-                        response = requests.get(product.image_url, timeout=download_timeout, stream=True)
-                        response.raise_for_status()
-                        # 限制最大图片为10MB
-                        max_size = 10 * 1024 * 1024
-                        image_chunks = []
-                        total_size = 0
-                        for chunk in response.iter_content(chunk_size=8192):
-                            if chunk:
-                                image_chunks.append(chunk)
-                                total_size += len(chunk)
-                                if total_size > max_size:
-                                    _logger.warning(f"Image too large for product ID {product.id}: {total_size} bytes, aborting.")
-                                    raise ValueError("Image too large")
-                        image_content = b"".join(image_chunks)
-                        if not image_content:
-                            _logger.warning(f"Downloaded image content is empty for product ID {product.id} from URL: {product.image_url}")
-                            raise ValueError("Empty image content")
-                        image_url_cache[product.image_url] = image_content
-                        response.close()
+                        image_content, original_size, etag, last_modified = future.result()
                     except (requests.exceptions.Timeout, requests.exceptions.RequestException, socket.error, ValueError) as e:
-                        _logger.warning(f"Failed to download image for product ID {product.id} from URL {product.image_url}: {e}")
-                        product.image_download_fail_count += 1
-                        if product.image_download_fail_count >= 3:
-                            product.image_download_failed = True
-                            _logger.warning(f"Product ID {product.id} (SKU: {product.default_code}) marked as failed after 3 unsuccessful attempts.")
-                        try:
-                            if 'response' in locals():
-                                response.close()
-                        except Exception:
-                            pass
+                        _logger.warning(f"Failed to download image for product IDs {products.ids} from URL {url}: {e}")
+                        self._register_fetch_failure(url, e, host_states, open_hosts)
+                        for product in products:
+                            product._register_image_failure()
+                        # 失败与退避状态立即提交；提交释放了批次的行锁，重新锁定还在下载的产品
+                        self._commit_image_batch(success_count)
+                        locked = Product.union(*(products_by_url[pending_url] for pending_url in futures.values()))._relock_image_candidates()
+                        for pending_url in futures.values():
+                            products_by_url[pending_url] &= locked
                         continue
                     except Exception as e:
-                        _logger.error(f"Unexpected error downloading image for product ID {product.id} from URL {product.image_url}: {e}", exc_info=True)
-                        try:
-                            if 'response' in locals():
-                                response.close()
-                        except Exception:
-                            pass
+                        _logger.error(f"Unexpected error downloading image for product IDs {products.ids} from URL {url}: {e}", exc_info=True)
+                        continue
+                    self._register_host_success(url, host_states)
+                    try:
+                        with self.env.cr.savepoint():
+                            blob = ImageSource._register_content(url, image_content, original_size, etag, last_modified)
+                    except Exception as e_store:
+                        _logger.error(f"Failed to store image downloaded from URL {url}: {e_store}", exc_info=True)
+                        continue
+                    _image_content_cache.put(blob.checksum, image_content)
+                    original_bytes += original_size
+                    stored_bytes += len(image_content)
+                    success_count += self._store_downloaded_image(products, blob, image_content)
+
+                self._commit_image_batch(success_count)
+                if futures:
+                    break
+
+            # 5. 剩余时间重新验证已下载的图片
+            revalidated_ids = []
+            revalidate_before = fields.Datetime.now() - timedelta(days=revalidate_days)
+            while revalidate_days and time.monotonic() < deadline:
+                now = fields.Datetime.now()
+                with profiling.phase('lookup'):
+                    sources = ImageSource.search([
+                        ('id', 'not in', revalidated_ids),
+                        ('blob_id', '!=', False),
+                        ('host', 'not in', list(open_hosts)),
+                        '|', ('date_checked', '=', False), ('date_checked', '<', revalidate_before),
+                        '|', ('next_retry_at', '=', False), ('next_retry_at', '<=', now),
+                    ], order='date_checked asc nulls first', limit=batch_size)
+                if not sources:
+                    break
+                revalidated_ids.extend(sources.ids)
+                futures = {}
+                host_counts = Counter()
+                for source in sources:
+                    host = urlparse(source.url).netloc.lower()
+                    if host in open_hosts:
+                        continue
+                    if host_counts[host] >= per_host_batch_limit:
+                        revalidated_ids.remove(source.id)
+                        continue
+                    host_counts[host] += 1
+                    futures[executor.submit(_fetch_image, session, source.url, download_timeout, host_semaphores[host],
+                                            process_pool, source.etag, source.last_modified)] = source
+                completed = as_completed(futures, timeout=max(0.0, wait_deadline - time.monotonic()))
+                while True:
+                    with profiling.phase('download'):
+                        future = _next_completed(completed, futures)
+                    if future is None:
+                        break
+                    source = futures.pop(future)
+                    try:
+                        image_content, original_size, etag, last_modified = future.result()
+                    except (requests.exceptions.Timeout, requests.exceptions.RequestException, socket.error, ValueError) as e:
+                        # 重新验证失败时保留已有图片，只推迟下次检查
+                        _logger.warning(f"Failed to revalidate image URL {source.url}: {e}")
+                        self._register_fetch_failure(source.url, e, host_states, open_hosts)
+                        self._commit_image_batch(success_count)
+                        continue
+                    except Exception as e:
+                        _logger.error(f"Unexpected error revalidating image URL {source.url}: {e}", exc_info=True)
+                        continue
+                    self._register_host_success(source.url, host_states)
+                    if image_content is None:
+                        source._register_not_modified()
                         continue
+                    old_blob = source.blob_id
+                    try:
+                        with self.env.cr.savepoint():
+                            blob = ImageSource._register_content(source.url, image_content, original_size, etag, last_modified)
+                    except Exception as e_store:
+                        _logger.error(f"Failed to store image downloaded from URL {source.url}: {e_store}", exc_info=True)
+                        continue
+                    if blob != old_blob:
+                        products = Product.search([('image_url', '=', source.url)])
+                        _logger.info(f"Image behind URL {source.url} changed, updating product IDs {products.ids}")
+                        _image_content_cache.put(blob.checksum, image_content)
+                        success_count += self._store_downloaded_image(products, blob, image_content)
+
+                self._commit_image_batch(success_count)
+                if futures:
+                    break
+        finally:
+            executor.shutdown(wait=False)
+
+        _logger.info(f"Finished cron_update_product_images: Processed {processed_count} products, successfully updated {success_count} images, "
+                     f"skipped {skipped_count} waiting for retry. Revalidated {len(revalidated_ids)} image URLs. "
+                     f"Downloaded {original_bytes / 1024 / 1024:.1f} MB, stored {stored_bytes / 1024 / 1024:.1f} MB after processing.")
+        return True
+
+    @api.model
+    def _select_image_candidates(self, limit, exclude_ids=()):
+        """ 按优先级取一批待下载图片的产品 id 并加行锁。
+
+        查询走 image_pending 的部分索引，URL 在退避等待中的产品跳过；FOR UPDATE SKIP LOCKED
+        使多个 cron worker 可以同时取到互不重叠的批次，行锁在批次提交时释放。
+        """
+        self.flush_model(['image_pending', 'image_priority', 'image_url'])
+        self.env['product.image.source'].flush_model(['url', 'next_retry_at'])
+        self.env.cr.execute("""
+            SELECT t.id
+              FROM product_template t
+             WHERE t.image_pending
+               AND t.id != ALL(%s)
+               AND NOT EXISTS (
+                   SELECT 1
+                     FROM product_image_source s
+                    WHERE s.url = t.image_url
+                      AND s.next_retry_at > (now() AT TIME ZONE 'UTC')
+               )
+          ORDER BY t.image_priority, t.id
+             LIMIT %s
+               FOR UPDATE OF t SKIP LOCKED
+        """, [list(exclude_ids), limit])
+        return [row[0] for row in self.env.cr.fetchall()]
+
+    def _relock_image_candidates(self):
+        """ 提交释放行锁后，重新锁定本批次中还在下载的产品（见 _select_image_candidates），返回锁定成功的产品；
+        其间已被其它 cron worker 取走的产品不再由本批次写入 """
+        if not self:
+            return self
+        self.env.cr.execute("SELECT id FROM product_template WHERE id IN %s FOR UPDATE SKIP LOCKED", [tuple(self.ids)])
+        return self.browse([row[0] for row in self.env.cr.fetchall()])
+
+    @api.model
+    def _register_fetch_failure(self, url, error, host_states, open_hosts):
+        """ 记录 URL 的失败与退避时间；域名本身的故障计入熔断 """
+        status = _failure_status(error)
+        try:
+            with self.env.cr.savepoint():
+                self.env['product.image.source']._register_failure(url, status, str(error))
+                if _is_host_failure(error):
+                    host_name = urlparse(url).netloc.lower()
+                    host = self.env['product.image.host']._register_failure(host_name, str(error), host_states.get(host_name))
+                    host_states[host_name] = host
+                    if host._is_open():
+                        open_hosts.add(host_name)
+        except Exception as e_store:
+            _logger.error(f"Failed to record the failure of image URL {url}: {e_store}", exc_info=True)
 
-            if image_content:
+    @api.model
+    def _register_host_success(self, url, host_states):
+        host = host_states.pop(urlparse(url).netloc.lower(), None)
+        if host:
+            host._register_success()
+
+    def _commit_image_batch(self, success_count):
+        try:
+            with profiling.phase('commit'):
+                self.env.cr.commit()
+            _logger.info(f"Committed batch of image updates. Total successful so far: {success_count}")
+        except Exception as e_commit:
+            _logger.error(f"Failed during commit for image updates: {e_commit}", exc_info=True)
+            self.env.cr.rollback()
+
+    def _store_downloaded_image(self, products, blob, image_content):
+        """ 在 cron 游标上串行写入图片，返回成功写入的产品数。
+        ir.attachment 按内容校验和存放文件，相同图片在 filestore 中只保存一份 """
+        success_count = 0
+        image_b64 = base64.b64encode(image_content)
+        with profiling.phase('write'):
+            for product in products:
                 try:
-                    product.write({
-                        'image_1920': base64.b64encode(image_content),
-                        'image_download_fail_count': 0,
-                        'image_download_failed': False
-                    })
+                    with self.env.cr.savepoint():
+                        product.write({
+                            'image_1920': image_b64,
+                            'image_blob_id': blob.id,
+                            'image_pending': False,
+                            'image_priority': 0,
+                            'image_download_fail_count': 0,
+                            'image_download_failed': False
+                        })
                     _logger.info(f"Successfully downloaded and saved image for product ID {product.id} (SKU: {product.default_code}).")
                     success_count += 1
-
-                    if success_count % commit_batch_size == 0:
-                        self.env.cr.commit()
-                        _logger.info(f"Committed batch of {commit_batch_size} image updates. Total successful so far: {success_count}")
                 except Exception as e_write:
                     _logger.error(f"Failed to write image to product ID {product.id} (SKU: {product.default_code}): {e_write}", exc_info=True)
-                    self.env.cr.rollback()
-                    continue
-
-        if success_count > 0 and success_count % commit_batch_size != 0:
-            try:
-                self.env.cr.commit()
-                _logger.info(f"Committed final batch of image updates. Total successful in this run: {success_count}")
-            except Exception as e_final_commit:
-                _logger.error(f"Failed during final commit for image updates: {e_final_commit}", exc_info=True)
-                self.env.cr.rollback()
-
-        _logger.info(f"Finished cron_update_product_images: Processed {processed_count} products, successfully updated {success_count} images.")
-        return True
\ No newline at end of file
+        return success_count
@@ -0,0 +1,35 @@
+from odoo import models, fields
+
+# 导入任务写入产品时设置的上下文键：导入写入的值与指纹一致，不清除指纹
+IMPORT_CONTEXT_KEY = 'product_excel_import'
+# 参与导入指纹计算的产品字段；在导入之外修改这些字段时清除指纹，下次导入会重新写入该产品
+FINGERPRINTED_TEMPLATE_FIELDS = {'name', 'default_code', 'image_url', 'weight', 'standard_price', 'property_stock_inventory'}
+FINGERPRINTED_PRODUCT_FIELDS = {'default_code', 'weight', 'standard_price'}
+
+
+class ProductTemplate(models.Model):
+    _inherit = 'product.template'
+
+    def write(self, vals):
+        res = super().write(vals)
+        if not self.env.context.get(IMPORT_CONTEXT_KEY) and FINGERPRINTED_TEMPLATE_FIELDS.intersection(vals):
+            self.with_context(active_test=False).product_variant_ids.filtered('import_fingerprint').write({'import_fingerprint': False})
+        return res
+
+
+class ProductProduct(models.Model):
+    _inherit = 'product.product'
+
+    # 指纹按 SKU 计算，因此保存在变体上：同一模板下的多个变体各自有自己的指纹
+    import_fingerprint = fields.Char(
+        string='Import Fingerprint',
+        copy=False,
+        readonly=True,
+        help="Hash of the values last imported for this SKU. Rows whose fingerprint is unchanged are skipped on re-import. "
+             "Cleared when an imported field is edited outside the importer."
+    )
+
+    def write(self, vals):
+        if not self.env.context.get(IMPORT_CONTEXT_KEY) and FINGERPRINTED_PRODUCT_FIELDS.intersection(vals):
+            vals = dict(vals, import_fingerprint=False)
+        return super().write(vals)
@@ -0,0 +1,38 @@
+/** @odoo-module **/
+
+import { registry } from "@web/core/registry";
+import { ProgressBarField } from "@web/views/fields/progress_bar/progress_bar_field";
+import { onMounted, onWillUnmount } from "@odoo/owl";
+
+// 任务排队或运行中时每隔 POLL_INTERVAL 毫秒重新读取记录，表单上的进度与统计随之更新
+const POLL_INTERVAL = 3000;
+const ACTIVE_STATES = ["queued", "running"];
+
+export class ImportJobProgressField extends ProgressBarField {
+    setup() {
+        super.setup();
+        onMounted(() => {
+            this.pollTimer = setInterval(() => this.poll(), POLL_INTERVAL);
+        });
+        onWillUnmount(() => clearInterval(this.pollTimer));
+    }
+
+    async poll() {
+        const record = this.props.record;
+        if (this.polling || !ACTIVE_STATES.includes(record.data.state)) {
+            return;
+        }
+        this.polling = true;
+        try {
+            // 有未保存的修改时不重新读取，避免覆盖用户的输入
+            if (!(await record.isDirty())) {
+                await record.load();
+                record.model.notify();
+            }
+        } finally {
+            this.polling = false;
+        }
+    }
+}
+
+registry.category("fields").add("import_job_progress", ImportJobProgressField);
@@ -0,0 +1,5 @@
+from . import test_batch_tuner
+from . import test_fingerprint
+from . import test_import_benchmark
+from . import test_import_job
+from . import test_mapping_profiles
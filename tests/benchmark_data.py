@@ -0,0 +1,79 @@
+import io
+import random
+
+from openpyxl import Workbook
+
+from ..tools import mapping_profiles
+
+# 坏单元格替换成的无法解析的数值
+BAD_CELL_VALUES = ('N/A', '-', '12,5kg', '?')
+BAD_CELL_FIELDS = ('weight', 'cost_price', 'decl_price_ext')
+
+
+def _record(sku, index, image_base_url, image_count, revision=0):
+    """ 一行合成数据（字段→值），revision 不同时产品名称与成本不同，用于模拟已存在但有变化的 SKU """
+    suffix = f" v{revision}" if revision else ""
+    return {
+        'sku': sku,
+        'product_name_cn': f"测试产品{index}{suffix}",
+        'product_name_en': f"Benchmark Product {index}{suffix}",
+        'image_url': f"{image_base_url}/img/{index % image_count}.jpg" if image_base_url else '',
+        'weight': round(0.05 + (index % 200) / 100, 2),
+        'cost_price': round(1 + (index % 997) / 10 + revision, 2),
+        'product_url_ext': f"https://example.com/products/{index}",
+        'decl_name_en_ext': f"Gift {index % 50}",
+        'decl_name_cn_ext': f"礼品{index % 50}",
+        'decl_price_ext': round(2 + (index % 30) / 2, 2),
+    }
+
+
+def benchmark_rows(count, new_ratio=0.5, unchanged_ratio=0.25, bad_cell_rate=0.01, sku_prefix='BENCH',
+                   image_base_url=None, image_count=100, seed=0):
+    """ 生成一次基准测试的数据，返回 (预置行, 导入行)。
+
+    导入行中前 ``new_ratio`` 比例为新 SKU，随后 ``unchanged_ratio`` 比例与预置行完全相同（导入时应被指纹跳过），
+    其余为已存在但内容有变化的 SKU。预置行需要在计时之前先导入一次。
+    ``bad_cell_rate`` 为新行与变化行中数值单元格被替换成无法解析文本的概率。
+    """
+    rng = random.Random(seed)
+    new_count = int(count * new_ratio)
+    unchanged_count = min(count - new_count, int(count * unchanged_ratio))
+    seed_records, import_records = [], []
+    for index in range(count):
+        sku = f"{sku_prefix}-{index:07d}"
+        if index < new_count:
+            record = _record(sku, index, image_base_url, image_count)
+        elif index < new_count + unchanged_count:
+            record = _record(sku, index, image_base_url, image_count)
+            seed_records.append(dict(record))
+            import_records.append(record)
+            continue
+        else:
+            seed_records.append(_record(sku, index, image_base_url, image_count))
+            record = _record(sku, index, image_base_url, image_count, revision=1)
+        for field in BAD_CELL_FIELDS:
+            if bad_cell_rate and rng.random() < bad_cell_rate:
+                record[field] = rng.choice(BAD_CELL_VALUES)
+        import_records.append(record)
+    return seed_records, import_records
+
+
+def write_spreadsheet(platform, records):
+    """ 按平台的列映射把合成数据写成 .xlsx，返回文件内容 """
+    columns = [spec for spec in mapping_profiles.PROFILES[platform].columns if isinstance(spec.column, int)]
+    width = max(spec.column for spec in columns) + 1
+    header = [f"Column {index + 1}" for index in range(width)]
+    for spec in columns:
+        header[spec.column] = spec.field
+
+    workbook = Workbook(write_only=True)
+    sheet = workbook.create_sheet()
+    sheet.append(header)
+    for record in records:
+        row = [None] * width
+        for spec in columns:
+            row[spec.column] = record.get(spec.field)
+        sheet.append(row)
+    buffer = io.BytesIO()
+    workbook.save(buffer)
+    return buffer.getvalue()
@@ -0,0 +1,86 @@
+import io
+import re
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+from PIL import Image
+
+
+class ImageServer:
+    """ 本地 HTTP 图片服务，替代真实的图片 CDN，用于在没有网络的环境下测试图片下载。
+
+    ``/img/<n>.jpg`` 返回一张由 n 决定颜色的 JPEG，每个请求先等待 ``latency`` 秒。
+    默认监听 127.0.0.2：图片 cron 会跳过 localhost / 127.0.0.1 的 URL。
+    """
+
+    PATH_RE = re.compile(r'^/img/(\d+)\.jpg$')
+
+    def __init__(self, latency=0.0, image_size=(800, 800), host='127.0.0.2', port=0):
+        self.latency = latency
+        self.image_size = image_size
+        self.host = host
+        self.port = port
+        self.request_count = 0
+        self._images = {}
+        self._lock = threading.Lock()
+        self._server = None
+        self._thread = None
+
+    @property
+    def base_url(self):
+        return f"http://{self.host}:{self._server.server_address[1]}"
+
+    def _image(self, number):
+        with self._lock:
+            self.request_count += 1
+            content = self._images.get(number)
+            if content is None:
+                color = ((number * 67) % 256, (number * 131) % 256, (number * 199) % 256)
+                buffer = io.BytesIO()
+                Image.new('RGB', self.image_size, color).save(buffer, format='JPEG', quality=85)
+                content = self._images[number] = buffer.getvalue()
+            return content
+
+    def _make_handler(self):
+        server = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                match = server.PATH_RE.match(self.path)
+                if server.latency:
+                    time.sleep(server.latency)
+                if not match:
+                    self.send_error(404)
+                    return
+                content = server._image(int(match.group(1)))
+                self.send_response(200)
+                self.send_header('Content-Type', 'image/jpeg')
+                self.send_header('Content-Length', str(len(content)))
+                self.end_headers()
+                self.wfile.write(content)
+
+            def log_message(self, format, *args):
+                pass
+
+        return Handler
+
+    def start(self):
+        self._server = ThreadingHTTPServer((self.host, self.port), self._make_handler())
+        self._server.daemon_threads = True
+        self._thread = threading.Thread(target=self._server.serve_forever, name='benchmark_image_server', daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        if self._server:
+            self._server.shutdown()
+            self._server.server_close()
+            self._thread.join()
+            self._server = None
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc):
+        self.stop()
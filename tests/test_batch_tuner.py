@@ -0,0 +1,23 @@
+from odoo.tests import BaseCase
+
+from ..tools.batch_tuner import AdaptiveBatchSizer
+
+
+class TestAdaptiveBatchSizer(BaseCase):
+
+    def test_targets_batch_duration(self):
+        sizer = AdaptiveBatchSizer(initial_size=500, target_seconds=5.0, max_commit_share=0.5)
+        # 1000 行/秒，目标 5 秒
+        self.assertEqual(sizer.record(500, 0.5, 0.01), 5000)
+        self.assertEqual(sizer(), 5000)
+
+    def test_commit_floor(self):
+        sizer = AdaptiveBatchSizer(initial_size=100, max_size=100000, target_seconds=1.0, max_commit_share=0.05)
+        # 100 行/秒，每次提交 1 秒：提交耗时不超过 5% 需要至少 1900 行
+        self.assertEqual(sizer.record(100, 1.0, 1.0), 1900)
+
+    def test_bounds_and_empty_batches(self):
+        sizer = AdaptiveBatchSizer(initial_size=500, min_size=50, max_size=5000)
+        self.assertEqual(sizer.record(0, 1.0, 0.1), 500)
+        self.assertEqual(sizer.record(10, 100.0, 0.0), 50)
+        self.assertEqual(sizer.record(100000, 1.0, 0.0), 5000)
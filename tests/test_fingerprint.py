@@ -0,0 +1,25 @@
+from odoo.tests import BaseCase
+
+from ..tools import fingerprint
+
+
+class TestFingerprint(BaseCase):
+
+    def test_row_fingerprint(self):
+        vals = {field: f"value {field}" for field in fingerprint.FINGERPRINT_FIELDS}
+        digest = fingerprint.row_fingerprint(vals, 7, True)
+        self.assertEqual(len(digest), 40)
+        self.assertEqual(digest, fingerprint.row_fingerprint(dict(vals, extra='ignored'), 7, True))
+        self.assertNotEqual(digest, fingerprint.row_fingerprint(dict(vals, weight_str='2'), 7, True))
+        # 默认库位等上下文参数也参与计算
+        self.assertNotEqual(digest, fingerprint.row_fingerprint(vals, 8, True))
+
+    def test_pack_row_hashes(self):
+        row_hashes = {'SKU-1': 'a' * 40, '测试': 'b' * 40}
+        self.assertEqual(fingerprint.unpack_row_hashes(fingerprint.pack_row_hashes(row_hashes)), row_hashes)
+        self.assertEqual(fingerprint.unpack_row_hashes(b''), {})
+
+    def test_pack_json(self):
+        rows = [[2, {'sku': 'SKU-1', 'weight': 1.5, 'cost_price': None}]]
+        self.assertEqual(fingerprint.unpack_json(fingerprint.pack_json(rows)), rows)
+        self.assertEqual(fingerprint.unpack_json(None, []), [])
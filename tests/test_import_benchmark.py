@@ -0,0 +1,232 @@
+import base64
+import json
+import logging
+import os
+import time
+
+from odoo import api, SUPERUSER_ID
+from odoo.tests import TransactionCase, tagged
+
+from ..tools import profiling
+from .benchmark_data import benchmark_rows, write_spreadsheet
+from .image_server import ImageServer
+
+_logger = logging.getLogger(__name__)
+
+# 基准测试参数，均可通过环境变量调整
+BENCHMARK_ENV_PREFIX = 'PRODUCT_IMPORT_BENCHMARK_'
+
+
+def _env(name, default, cast=str):
+    return cast(os.environ.get(BENCHMARK_ENV_PREFIX + name, default))
+
+
+def _env_sizes(name, default):
+    return [int(size) for size in _env(name, default).split(',') if size.strip()]
+
+
+@tagged('-standard', '-at_install', 'post_install', 'product_import_benchmark')
+class TestProductImportBenchmark(TransactionCase):
+    """ 导入与图片下载的性能基准，默认不运行。运行方式::
+
+        odoo-bin -d <db> -i product_excel_import_advanced --test-tags product_import_benchmark --stop-after-init
+
+    导入与 cron 一样需要逐块提交，所以基准在独立的游标上真实提交数据，结束后删除生成的产品。
+    请在专用的测试数据库上运行，并确保没有其它 cron worker 同时处理导入任务。
+
+    环境变量（前缀 PRODUCT_IMPORT_BENCHMARK_）：
+    SIZES（默认 1000,10000,100000）、NEW_RATIO（0.5）、UNCHANGED_RATIO（0.25）、BAD_CELL_RATE（0.01）、
+    MODE（bulk/row）、WORKERS（1）、DELTA_CHANGES（增量导入中变化的行数，500）、IMAGE_SIZES（500）、IMAGE_COUNT（不同图片数，200）、IMAGE_LATENCY（秒，0.05）、
+    OUTPUT（可选，结果以 JSON 行追加到该文件）。
+    """
+
+    def setUp(self):
+        super().setUp()
+        self.run_id = f"{int(time.time())}"
+        self.stock_location_id = self.env.ref('stock.stock_location_stock').id
+
+    def test_benchmark_import_dianxiaomi(self):
+        for size in _env_sizes('SIZES', '1000,10000,100000'):
+            self._benchmark_import('dianxiaomi', size)
+
+    def test_benchmark_import_mabangerp(self):
+        for size in _env_sizes('SIZES', '1000,10000,100000'):
+            self._benchmark_import('mabangerp', size)
+
+    def test_benchmark_delta_import(self):
+        for size in _env_sizes('SIZES', '1000,10000,100000'):
+            self._benchmark_delta_import('dianxiaomi', size)
+
+    def test_benchmark_image_cron(self):
+        for size in _env_sizes('IMAGE_SIZES', '500'):
+            self._benchmark_image_cron(size)
+
+    # -------------------------------------------------------------------------
+    # 导入
+    # -------------------------------------------------------------------------
+
+    def _benchmark_import(self, platform, size):
+        sku_prefix = f"BENCH-{platform[:3].upper()}{size}-{self.run_id}"
+        seed_records, import_records = benchmark_rows(
+            size,
+            new_ratio=_env('NEW_RATIO', 0.5, float),
+            unchanged_ratio=_env('UNCHANGED_RATIO', 0.25, float),
+            bad_cell_rate=_env('BAD_CELL_RATE', 0.01, float),
+            sku_prefix=sku_prefix,
+            image_base_url='https://img.example.com',
+        )
+        try:
+            if seed_records:
+                self._import_file(platform, write_spreadsheet(platform, seed_records), f"{sku_prefix}-seed.xlsx")
+            content = write_spreadsheet(platform, import_records)
+
+            profiler = profiling.PhaseProfiler()
+            start = time.perf_counter()
+            with profiling.activate(profiler), profiler.phase('other'):
+                job = self._import_file(platform, content, f"{sku_prefix}.xlsx")
+            elapsed = time.perf_counter() - start
+
+            self._report('import', profiler, elapsed, {
+                'platform': platform,
+                'rows': size,
+                'file_size': len(content),
+                'mode': job['import_mode'],
+                'workers': job['worker_count'],
+                'rows_per_second': round(size / elapsed, 1) if elapsed else 0,
+                'created': job['created'],
+                'updated': job['updated'],
+                'unchanged': job['unchanged'],
+                'collapsed': job['collapsed'],
+                'failed': job['failed'],
+            })
+            self.assertEqual(job['state'], 'done', job['message'])
+            self.assertEqual(job['total'], size)
+        finally:
+            self._cleanup(sku_prefix)
+
+    def _benchmark_delta_import(self, platform, size):
+        """ 先完整导入一次，再修改少量行的成本并以增量方式导入同一份目录 """
+        sku_prefix = f"BENCH-DELTA{size}-{self.run_id}"
+        _seed_records, records = benchmark_rows(size, new_ratio=1.0, unchanged_ratio=0.0, bad_cell_rate=0.0, sku_prefix=sku_prefix)
+        changes = min(size, _env('DELTA_CHANGES', 500, int))
+        try:
+            self._import_file(platform, write_spreadsheet(platform, records), f"{sku_prefix}-full.xlsx")
+            for record in records[:changes]:
+                record['cost_price'] = round(record['cost_price'] + 1, 2)
+            content = write_spreadsheet(platform, records)
+
+            profiler = profiling.PhaseProfiler()
+            start = time.perf_counter()
+            with profiling.activate(profiler), profiler.phase('other'):
+                job = self._import_file(platform, content, f"{sku_prefix}.xlsx", import_scope='delta')
+            elapsed = time.perf_counter() - start
+
+            self._report('delta_import', profiler, elapsed, {
+                'platform': platform,
+                'rows': size,
+                'changes': changes,
+                'mode': job['import_mode'],
+                'rows_per_second': round(size / elapsed, 1) if elapsed else 0,
+                'updated': job['updated'],
+                'unchanged': job['unchanged'],
+                'failed': job['failed'],
+            })
+            self.assertEqual(job['state'], 'done', job['message'])
+            self.assertEqual(job['updated'], changes)
+            self.assertEqual(job['unchanged'], size - changes)
+        finally:
+            self._cleanup(sku_prefix)
+
+    def _import_file(self, platform, content, filename, **wizard_vals):
+        """ 通过向导创建导入任务，并在当前进程中直接处理完（不等待 cron），返回任务的最终数据 """
+        with self.registry.cursor() as cr:
+            env = api.Environment(cr, SUPERUSER_ID, {})
+            wizard = env['product.import.wizard'].create({
+                'file': base64.b64encode(content),
+                'filename': filename,
+                'platform': platform,
+                'default_stock_location': self.stock_location_id,
+                'import_mode': _env('MODE', 'bulk'),
+                'worker_count': _env('WORKERS', 1, int),
+                **wizard_vals,
+            })
+            job = env['product.import.job'].browse(wizard.action_import_products()['res_id'])
+            cr.commit()
+            job._run(time.monotonic() + 24 * 3600)
+            job.invalidate_recordset()
+            return job.read(['state', 'import_mode', 'worker_count', 'total', 'failed', 'created', 'updated', 'unchanged', 'collapsed', 'message'])[0]
+
+    # -------------------------------------------------------------------------
+    # 图片下载
+    # -------------------------------------------------------------------------
+
+    def _benchmark_image_cron(self, size):
+        sku_prefix = f"BENCH-IMG{size}-{self.run_id}"
+        with ImageServer(latency=_env('IMAGE_LATENCY', 0.05, float)) as server:
+            image_count = _env('IMAGE_COUNT', 200, int)
+            try:
+                with self.registry.cursor() as cr:
+                    env = api.Environment(cr, SUPERUSER_ID, {})
+                    env['product.template'].create([{
+                        'name': f"Benchmark Image Product {index}",
+                        'default_code': f"{sku_prefix}-{index:07d}",
+                        'image_url': f"{server.base_url}/img/{index % image_count}.jpg",
+                    } for index in range(size)])
+
+                profiler = profiling.PhaseProfiler()
+                start = time.perf_counter()
+                with profiling.activate(profiler), profiler.phase('other'), self.registry.cursor() as cr:
+                    env = api.Environment(cr, SUPERUSER_ID, {})
+                    env['product.template'].cron_update_product_images(time_budget=24 * 3600)
+                    downloaded = env['product.template'].search_count([
+                        ('default_code', '=like', f"{sku_prefix}-%"),
+                        ('image_blob_id', '!=', False),
+                    ])
+                elapsed = time.perf_counter() - start
+
+                self._report('images', profiler, elapsed, {
+                    'products': size,
+                    'distinct_images': min(size, image_count),
+                    'http_requests': server.request_count,
+                    'latency': server.latency,
+                    'downloaded': downloaded,
+                    'products_per_second': round(size / elapsed, 1) if elapsed else 0,
+                })
+                self.assertEqual(downloaded, size)
+            finally:
+                self._cleanup(sku_prefix, image_base_url=server.base_url)
+
+    # -------------------------------------------------------------------------
+    # 工具
+    # -------------------------------------------------------------------------
+
+    def _report(self, benchmark, profiler, elapsed, values):
+        phases = profiler.as_dict()
+        result = dict(values, benchmark=benchmark, seconds=round(elapsed, 3),
+                      queries=sum(entry['queries'] for entry in phases.values()),
+                      peak_rss_mb=round(profiling.peak_rss_kb() / 1024, 1),
+                      phases={name: {key: round(value, 3) for key, value in entry.items()} for name, entry in phases.items()})
+        lines = [f"{key}: {value}" for key, value in result.items() if key != 'phases']
+        lines.append(profiling.format_report(phases))
+        _logger.info("Benchmark %s:\n%s", benchmark, '\n'.join(lines))
+        output = _env('OUTPUT', '')
+        if output:
+            with open(output, 'a', encoding='utf-8') as output_file:
+                output_file.write(json.dumps(result) + '\n')
+
+    def _cleanup(self, sku_prefix, image_base_url=None):
+        """ 删除基准测试生成的产品、任务、日志与图片索引 """
+        with self.registry.cursor() as cr:
+            env = api.Environment(cr, SUPERUSER_ID, {})
+            templates = env['product.template'].with_context(active_test=False).search([('default_code', '=like', f"{sku_prefix}-%")])
+            templates.unlink()
+            jobs = env['product.import.job'].search([('filename', '=like', f"{sku_prefix}%")])
+            import_files = jobs.import_file_id
+            jobs.log_id.unlink()
+            jobs.unlink()
+            import_files.unlink()
+            if image_base_url:
+                sources = env['product.image.source'].search([('url', '=like', f"{image_base_url}/%")])
+                blobs = sources.blob_id
+                sources.unlink()
+                blobs.filtered(lambda blob: not blob.source_ids).unlink()
@@ -0,0 +1,208 @@
+import base64
+import time
+from collections import Counter
+
+from odoo import Command
+from odoo.tests import TransactionCase, tagged
+
+from ..models.product_template_import import IMPORT_CONTEXT_KEY
+from ..tools import mapping_profiles
+from .benchmark_data import write_spreadsheet
+
+# 1x1 像素的 PNG，用于模拟手动上传的图片
+PIXEL_PNG = base64.b64encode(base64.b64decode(
+    b'iVBORw0KGgoAAAANSUhEUgAAAAEAAAABCAYAAAAfFcSJAAAADUlEQVR42mP8z8DwHwAFBQIAX8jx0gAAAABJRU5ErkJggg=='))
+
+
+@tagged('-at_install', 'post_install')
+class TestProductImportJob(TransactionCase):
+    """ 端到端运行小型导入任务（在当前进程中直接处理，不等待 cron）。
+    任务逐块提交，测试中提交只刷新 ORM 的待写数据，整个测试结束后回滚 """
+
+    def setUp(self):
+        super().setUp()
+        self.patch(self.env.cr, 'commit', self.env.flush_all)
+        self.location = self.env.ref('stock.stock_location_stock')
+        self.sku_prefix = 'TEST-IMPORT'
+
+    def _record(self, index, **values):
+        record = {
+            'sku': f"{self.sku_prefix}-{index}",
+            'product_name_cn': f"测试产品{index}",
+            'product_name_en': f"Test Product {index}",
+            'image_url': '',
+            'weight': 0.5,
+            'cost_price': 10.0 + index,
+            'product_url_ext': '',
+            'decl_name_en_ext': '',
+            'decl_name_cn_ext': '',
+            'decl_price_ext': 0.0,
+        }
+        record.update(values)
+        return record
+
+    def _import(self, records, **wizard_vals):
+        wizard = self.env['product.import.wizard'].create({
+            'file': base64.b64encode(write_spreadsheet('dianxiaomi', records)),
+            'filename': f"{self.sku_prefix}.xlsx",
+            'platform': 'dianxiaomi',
+            'default_stock_location': self.location.id,
+            'import_mode': 'bulk',
+            'worker_count': 1,
+            **wizard_vals,
+        })
+        job = self.env['product.import.job'].browse(wizard.action_import_products()['res_id'])
+        job._run(time.monotonic() + 3600)
+        self.assertEqual(job.state, 'done', job.message)
+        return job
+
+    def _product(self, index):
+        return self.env['product.product'].with_context(active_test=False).search([('default_code', '=', f"{self.sku_prefix}-{index}")])
+
+    def test_create_update_unchanged(self):
+        records = [self._record(index) for index in range(3)]
+        job = self._import(records)
+        self.assertEqual((job.total, job.success, job.created, job.updated, job.unchanged), (3, 3, 3, 0, 0))
+        self.assertEqual(self._product(1).standard_price, 11.0)
+        self.assertEqual(self._product(1).name, f"Test Product 1测试产品1{self.sku_prefix}-1")
+        self.assertTrue(job.log_id)
+
+        records[1]['cost_price'] = 99.0
+        job = self._import(records)
+        self.assertEqual((job.total, job.success, job.created, job.updated, job.unchanged), (3, 3, 0, 1, 2))
+        self.assertEqual(self._product(1).standard_price, 99.0)
+        # 导入完成后不保留预扫描的分块
+        self.assertFalse(self.env['product.import.job.chunk'].search([('job_id', '=', job.id)]))
+
+    def test_duplicate_policy_last(self):
+        job = self._import([
+            self._record(1, product_name_en='First', weight=1.0),
+            self._record(1, product_name_en='Last', weight=None),
+        ], duplicate_policy='last')
+        self.assertEqual((job.total, job.success, job.created, job.collapsed), (2, 2, 1, 1))
+        product = self._product(1)
+        self.assertEqual(len(product), 1)
+        self.assertTrue(product.name.startswith('Last'))
+        self.assertEqual(product.weight, 0.0)
+
+    def test_duplicate_policy_first_non_empty(self):
+        job = self._import([
+            self._record(1, product_name_en='First', weight=None, cost_price=5.0),
+            self._record(1, product_name_en='Second', weight=2.0, cost_price=7.0),
+        ], duplicate_policy='first_non_empty')
+        self.assertEqual((job.total, job.success, job.created, job.collapsed), (2, 2, 1, 1))
+        product = self._product(1)
+        self.assertTrue(product.name.startswith('First'))
+        self.assertEqual(product.weight, 2.0)
+        self.assertEqual(product.standard_price, 5.0)
+
+    def test_duplicate_policy_reject(self):
+        job = self._import([
+            self._record(1),
+            self._record(2),
+            self._record(1, product_name_en='Again'),
+        ], duplicate_policy='reject')
+        self.assertEqual((job.total, job.success, job.failed, job.created), (3, 1, 2, 1))
+        self.assertFalse(self._product(1))
+        self.assertTrue(self._product(2))
+        self.assertIn('rejected', job.message)
+
+    def test_delta_and_archive_missing(self):
+        records = [self._record(index) for index in range(4)]
+        self._import(records)
+
+        records[0]['cost_price'] = 50.0
+        records[3] = self._record(4)
+        job = self._import(records, import_scope='delta', archive_missing=True)
+        self.assertTrue(job.baseline_log_id)
+        self.assertEqual((job.total, job.success, job.created, job.updated, job.unchanged, job.archived), (4, 4, 1, 1, 2, 1))
+        self.assertEqual(self._product(0).standard_price, 50.0)
+        self.assertTrue(self._product(4))
+        self.assertFalse(self._product(3).active)
+        # 新的快照保存在本次的日志上，之前的快照被清除
+        self.assertTrue(job.log_id.with_context(bin_size=True).row_hashes)
+        self.assertFalse(job.baseline_log_id.with_context(bin_size=True).row_hashes)
+
+    def test_cancel_request(self):
+        wizard = self.env['product.import.wizard'].create({
+            'file': base64.b64encode(write_spreadsheet('dianxiaomi', [self._record(1)])),
+            'filename': f"{self.sku_prefix}.xlsx",
+            'platform': 'dianxiaomi',
+            'default_stock_location': self.location.id,
+        })
+        job = self.env['product.import.job'].browse(wizard.action_import_products()['res_id'])
+        job.action_cancel()
+        # 界面只登记请求，由处理任务的进程将任务标记为已取消
+        self.assertEqual(job.state, 'queued')
+        self.assertTrue(job.cancel_requested)
+        job._run(time.monotonic() + 3600)
+        self.assertEqual(job.state, 'cancelled')
+        self.assertFalse(self._product(1))
+        job.invalidate_recordset(['cancel_requested'])
+        self.assertFalse(job.cancel_requested)
+
+    def test_manual_image_upload_clears_pending(self):
+        template = self.env['product.template'].create({
+            'name': 'Image Test',
+            'default_code': f"{self.sku_prefix}-IMG",
+            'image_url': 'https://img.example.com/test.jpg',
+        })
+        self.assertTrue(template.image_pending)
+        template.write({'image_1920': PIXEL_PNG})
+        self.assertFalse(template.image_pending)
+
+    def test_fingerprint_cleared_on_edit(self):
+        self._import([self._record(1), self._record(2)])
+        product_1, product_2 = self._product(1), self._product(2)
+        self.assertTrue(product_1.import_fingerprint)
+        self.assertTrue(product_2.import_fingerprint)
+
+        # 导入之外修改参与指纹的字段时清除指纹，下次导入会重新写入
+        product_1.write({'standard_price': 1.0})
+        self.assertFalse(product_1.import_fingerprint)
+        product_2.product_tmpl_id.write({'name': 'Renamed'})
+        self.assertFalse(product_2.import_fingerprint)
+
+        job = self._import([self._record(1), self._record(2)])
+        self.assertEqual((job.updated, job.unchanged), (2, 0))
+        self.assertEqual(product_1.standard_price, 11.0)
+
+    def test_upsert_rows(self):
+        job = self.env['product.import.job'].with_context(**{IMPORT_CONTEXT_KEY: True}).create({
+            'name': self.sku_prefix,
+            'platform': 'dianxiaomi',
+            'default_stock_location': self.location.id,
+        })
+        profile = mapping_profiles.compile_profile('dianxiaomi')
+        record = self._record(1)
+        values = [None] * 19
+        for spec in mapping_profiles.PROFILES['dianxiaomi'].columns:
+            values[spec.column] = record[spec.field]
+        rows = profile.extract([(2, tuple(values))])
+
+        stats, messages = Counter(), []
+        self.assertEqual(job._upsert_rows(rows, messages, stats), 1)
+        self.assertEqual((stats['created'], stats['updated'], stats['unchanged']), (1, 0, 0), messages)
+        fingerprint = self._product(1).import_fingerprint
+        self.assertTrue(fingerprint)
+
+        stats = Counter()
+        self.assertEqual(job._upsert_rows(rows, messages, stats), 1)
+        self.assertEqual((stats['created'], stats['updated'], stats['unchanged']), (0, 0, 1), messages)
+        self.assertEqual(self._product(1).import_fingerprint, fingerprint)
+
+    def test_store_fingerprints_per_variant(self):
+        """ 同一模板的多个变体各自保存自己的指纹 """
+        attribute = self.env['product.attribute'].create({
+            'name': 'Import Test Size',
+            'value_ids': [Command.create({'name': 'S'}), Command.create({'name': 'M'})],
+        })
+        template = self.env['product.template'].create({
+            'name': 'Variant Test',
+            'attribute_line_ids': [Command.create({'attribute_id': attribute.id, 'value_ids': [Command.set(attribute.value_ids.ids)]})],
+        })
+        variant_s, variant_m = template.product_variant_ids
+        job = self.env['product.import.job'].new({'platform': 'dianxiaomi'})
+        job._store_fingerprints([(variant_s.id, 'a' * 40), (variant_m.id, 'b' * 40)])
+        self.assertEqual(variant_s.import_fingerprint, 'a' * 40)
+        self.assertEqual(variant_m.import_fingerprint, 'b' * 40)
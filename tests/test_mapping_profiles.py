@@ -0,0 +1,89 @@
+from odoo.tests import BaseCase
+
+from ..tools import mapping_profiles
+
+
+class TestMappingProfiles(BaseCase):
+    """ 列映射的提取与合并，不需要数据库 """
+
+    def setUp(self):
+        super().setUp()
+        self.profile = mapping_profiles.compile_profile('dianxiaomi')
+
+    def _row(self, sku, name_cn='', name_en='', weight=None, cost=None):
+        values = [None] * 19
+        values[0], values[2], values[3], values[7], values[8] = sku, name_cn, name_en, weight, cost
+        return tuple(values)
+
+    def test_extract_values(self):
+        [(row_num, vals)] = self.profile.extract([(2, self._row(' SKU-1 ', '杯子', 'Cup ', '1.5', 3))])
+        self.assertEqual(row_num, 2)
+        self.assertEqual(vals['sku'], 'SKU-1')
+        self.assertEqual(vals['product_name'], 'Cup杯子SKU-1')
+        self.assertEqual(vals['weight'], 1.5)
+        self.assertEqual(vals['cost_price'], 3)
+        # 空白数值单元格取列默认值
+        self.assertEqual(vals['decl_price_ext'], 0.0)
+        self.assertEqual(vals['decl_price_ext_str'], '0.0')
+
+    def test_extract_invalid_numbers(self):
+        [(_row_num, vals)] = self.profile.extract([(2, self._row('SKU-1', weight='12,5kg'))])
+        self.assertIsNone(vals['weight'])
+        self.assertEqual(vals['weight_str'], '12,5kg')
+
+    def test_extract_keeps_integer_skus(self):
+        """ 有空单元格的整数列不能变成浮点数，长 SKU 必须保持原样 """
+        rows = self.profile.extract([
+            (2, self._row(12345678901234567)),
+            (3, self._row(None)),
+            (4, self._row(42.0)),
+        ])
+        self.assertEqual([vals['sku'] for _row_num, vals in rows], ['12345678901234567', '', '42'])
+
+    def test_extract_short_rows(self):
+        [(_row_num, vals)] = self.profile.extract([(2, ('SKU-1',))])
+        self.assertEqual(vals['sku'], 'SKU-1')
+        self.assertEqual(vals['image_url'], '')
+        self.assertEqual(vals['weight'], 0.0)
+
+    def test_header_columns(self):
+        profile = mapping_profiles.CompiledProfile(
+            mapping_profiles.MappingProfile([mapping_profiles.ColumnSpec('sku', 'Variant SKU')], {}),
+            header=['Title', ' Variant SKU '],
+        )
+        self.assertEqual(profile.extract([(2, ('Cup', 'SKU-1'))])[0][1], {'sku': 'SKU-1'})
+        with self.assertRaises(ValueError):
+            mapping_profiles.CompiledProfile(
+                mapping_profiles.MappingProfile([mapping_profiles.ColumnSpec('sku', 'Variant SKU')], {}), header=['Title'])
+
+    def test_merge_first_non_empty(self):
+        rows = self.profile.extract([
+            (2, self._row('SKU-1', name_en='Cup', cost='N/A')),
+            (3, self._row('SKU-1', name_cn='杯子', weight='2', cost='5')),
+        ])
+        merged = self.profile.merge_first_non_empty([vals for _row_num, vals in rows])
+        self.assertEqual(merged['product_name'], 'Cup杯子SKU-1')
+        self.assertEqual(merged['weight'], 2)
+        # 无法解析的文本也是非空值，解析值与原始文本取自同一行
+        self.assertIsNone(merged['cost_price'])
+        self.assertEqual(merged['cost_price_str'], 'N/A')
+
+    def test_shopify_header_mapping(self):
+        header = ['Handle', 'Title', 'Body (HTML)', 'Variant SKU', 'Variant Grams', 'Image Src', 'Cost per item']
+        profile = mapping_profiles.compile_profile('shopify', header)
+        rows = profile.extract([
+            (2, ('cup', 'Cup', '<p>Cup</p>', 'SKU-1', 250, 'https://cdn.example.com/cup.jpg', '3.5')),
+            (3, ('cup', None, None, None, None, 'https://cdn.example.com/cup-2.jpg', None)),
+        ])
+        vals = rows[0][1]
+        self.assertEqual(vals['sku'], 'SKU-1')
+        self.assertEqual(vals['product_name'], 'CupSKU-1')
+        self.assertEqual(vals['image_url'], 'https://cdn.example.com/cup.jpg')
+        self.assertEqual(vals['weight'], 0.25)
+        self.assertEqual(vals['weight_str'], '250')
+        self.assertEqual(vals['cost_price'], 3.5)
+        self.assertEqual(vals['decl_name_en_ext'], '')
+        # 附加图片行没有 SKU
+        self.assertEqual(rows[1][1]['sku'], '')
+        with self.assertRaises(ValueError):
+            mapping_profiles.compile_profile('shopify', ['Handle', 'Title'])
@@ -0,0 +1,8 @@
+from . import batch_tuner
+from . import fingerprint
+from . import image_processing
+from . import lru_cache
+from . import mapping_profiles
+from . import profiling
+from . import spreadsheet_reader
+from . import time_budget
@@ -0,0 +1,37 @@
+class AdaptiveBatchSizer:
+    """ 根据实测的处理速度与提交耗时动态调整每次提交的行数。
+
+    目标：每个批次大约耗时 ``target_seconds``，且提交耗时不超过批次总耗时的 ``max_commit_share``。
+    新的批次大小按指数滑动平均平滑，并限制在 [min_size, max_size] 之间。
+    """
+
+    def __init__(self, initial_size=500, min_size=50, max_size=5000, target_seconds=5.0, max_commit_share=0.05, smoothing=0.5):
+        self.size = initial_size
+        self.min_size = min_size
+        self.max_size = max_size
+        self.target_seconds = target_seconds
+        self.max_commit_share = max_commit_share
+        self.smoothing = smoothing
+        self.rows_per_second = None
+        self.commit_seconds = None
+
+    def __call__(self):
+        return self.size
+
+    def record(self, rows, work_seconds, commit_seconds):
+        """ 记录一个批次的行数、处理耗时与提交耗时，并更新下一个批次的大小 """
+        if rows <= 0 or work_seconds <= 0:
+            return self.size
+        rows_per_second = rows / work_seconds
+        if self.rows_per_second is None:
+            self.rows_per_second = rows_per_second
+            self.commit_seconds = commit_seconds
+        else:
+            self.rows_per_second += self.smoothing * (rows_per_second - self.rows_per_second)
+            self.commit_seconds += self.smoothing * (commit_seconds - self.commit_seconds)
+
+        # 达到目标批次耗时所需的行数，以及把提交开销压到上限以内所需的最少行数
+        size_for_target = self.rows_per_second * self.target_seconds
+        commit_floor = self.rows_per_second * self.commit_seconds * (1 - self.max_commit_share) / self.max_commit_share
+        self.size = int(min(self.max_size, max(self.min_size, size_for_target, commit_floor)))
+        return self.size
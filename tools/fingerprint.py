@@ -0,0 +1,43 @@
+import gzip
+import hashlib
+import json
+
+# 参与指纹计算的导入字段（规范化后的文本值），任一字段变化都会使指纹变化
+FINGERPRINT_FIELDS = (
+    'sku',
+    'product_name',
+    'image_url',
+    'weight_str',
+    'cost_price_str',
+    'product_url_ext',
+    'decl_name_en_ext',
+    'decl_name_cn_ext',
+    'decl_price_ext_str',
+)
+
+
+def row_fingerprint(vals, *context):
+    """ 计算一行导入数据的 SHA-1 指纹。context 为影响导入结果的额外参数（如默认库位） """
+    payload = json.dumps([vals.get(field) for field in FINGERPRINT_FIELDS] + list(context),
+                         ensure_ascii=False, separators=(',', ':'), default=str)
+    return hashlib.sha1(payload.encode('utf-8')).hexdigest()
+
+
+def pack_json(value):
+    """ 将 JSON 可序列化的值压缩为 gzip JSON """
+    return gzip.compress(json.dumps(value, ensure_ascii=False, separators=(',', ':')).encode('utf-8'))
+
+
+def unpack_json(data, default=None):
+    """ pack_json() 的逆操作，data 为空时返回 default """
+    return json.loads(gzip.decompress(data).decode('utf-8')) if data else default
+
+
+def pack_row_hashes(row_hashes):
+    """ 将 {SKU: 指纹} 快照压缩为 gzip JSON """
+    return pack_json(row_hashes)
+
+
+def unpack_row_hashes(data):
+    """ pack_row_hashes() 的逆操作，data 为空时返回空字典 """
+    return unpack_json(data, {})
@@ -0,0 +1,73 @@
+import importlib.util
+import io
+import sys
+
+from PIL import Image, ImageOps
+
+# 保存的图片最长边（与 image_1920 一致）
+IMAGE_MAX_SIZE = 1920
+# 重新编码 JPEG 的质量
+IMAGE_QUALITY = 85
+# 像素数上限，超过的图片视为无效（防止解压炸弹）
+MAX_IMAGE_PIXELS = 50 * 1000 * 1000
+
+EXIF_ORIENTATION = 0x0112
+
+# 本文件在进程池中使用的顶层模块名，以及子进程 initializer 用 runpy 执行本文件时的 __name__（见 load_standalone）
+STANDALONE_MODULE_NAME = 'product_excel_import_image_processing'
+POOL_INITIALIZER_RUN_NAME = '__product_image_pool_init__'
+
+
+def load_standalone():
+    """ 将本文件作为顶层模块 ``STANDALONE_MODULE_NAME`` 加载并注册到 sys.modules，返回该模块。
+
+    spawn 启动的子进程是新的解释器，Odoo 的 addons 路径只在 parse_config() 之后才加入 odoo.addons.__path__，
+    子进程无法按 odoo.addons.<模块> 的名称反序列化提交的函数。提交给进程池的因此是这个顶层模块中的函数；
+    本文件只依赖标准库与 PIL，子进程的 initializer 用 runpy.run_path 执行本文件，以同样的名称注册它。
+    """
+    module = sys.modules.get(STANDALONE_MODULE_NAME)
+    if module is None:
+        spec = importlib.util.spec_from_file_location(STANDALONE_MODULE_NAME, __file__)
+        module = importlib.util.module_from_spec(spec)
+        sys.modules[STANDALONE_MODULE_NAME] = module
+        spec.loader.exec_module(module)
+    return module
+
+
+def process_image(content, max_size=IMAGE_MAX_SIZE, quality=IMAGE_QUALITY):
+    """ 校验并优化下载的图片，返回要保存的内容。内容不是有效图片时抛出 ValueError。
+
+    最长边超过 ``max_size`` 的图片等比缩小，并按 EXIF 方向旋转；不透明图片编码为 JPEG，
+    带透明通道的编码为 PNG。原图无需缩放或旋转、格式可用且重新编码后不会更小时直接返回原图。
+    只依赖 PIL，在进程池中执行，不访问 ORM。
+    """
+    try:
+        with Image.open(io.BytesIO(content)) as probe:
+            probe.verify()
+        image = Image.open(io.BytesIO(content))
+        original_format = image.format
+        if image.width * image.height > MAX_IMAGE_PIXELS:
+            raise ValueError(f"Image too large: {image.width}x{image.height} pixels")
+        rotated = image.getexif().get(EXIF_ORIENTATION, 1) != 1
+        image = ImageOps.exif_transpose(image)
+        resized = max(image.size) > max_size
+        if resized:
+            image.thumbnail((max_size, max_size), Image.LANCZOS)
+
+        has_alpha = image.mode in ('RGBA', 'LA') or (image.mode == 'P' and 'transparency' in image.info)
+        buffer = io.BytesIO()
+        if has_alpha:
+            image.save(buffer, format='PNG', optimize=True)
+        else:
+            image.convert('RGB').save(buffer, format='JPEG', quality=quality, optimize=True, progressive=True)
+    except (OSError, SyntaxError, Image.DecompressionBombError) as e:
+        raise ValueError(f"Invalid image content: {e}") from e
+
+    processed = buffer.getvalue()
+    if not resized and not rotated and original_format in ('JPEG', 'PNG') and len(processed) >= len(content):
+        return content
+    return processed
+
+
+if __name__ == POOL_INITIALIZER_RUN_NAME:
+    load_standalone()
@@ -0,0 +1,46 @@
+import threading
+from collections import OrderedDict
+
+
+class ByteBudgetLRU:
+    """ 按字节数限制容量的 LRU 缓存，值必须是 bytes。超出预算时淘汰最久未使用的条目 """
+
+    def __init__(self, max_bytes):
+        self.max_bytes = max_bytes
+        self.current_bytes = 0
+        self._data = OrderedDict()
+        self._lock = threading.Lock()
+
+    def __contains__(self, key):
+        with self._lock:
+            return key in self._data
+
+    def __len__(self):
+        return len(self._data)
+
+    def get(self, key, default=None):
+        with self._lock:
+            value = self._data.get(key)
+            if value is None:
+                return default
+            self._data.move_to_end(key)
+            return value
+
+    def put(self, key, value):
+        size = len(value)
+        if size > self.max_bytes:
+            return
+        with self._lock:
+            old = self._data.pop(key, None)
+            if old is not None:
+                self.current_bytes -= len(old)
+            self._data[key] = value
+            self.current_bytes += size
+            while self.current_bytes > self.max_bytes:
+                _key, evicted = self._data.popitem(last=False)
+                self.current_bytes -= len(evicted)
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+            self.current_bytes = 0
@@ -0,0 +1,162 @@
+from collections import namedtuple
+
+import numpy as np
+import pandas as pd
+
+# 一个目标字段的列映射：column 为列序号（从 0 开始）、表头名称或 None（文件中没有该列，取默认值）；kind 为 'text' 或 'float'。
+# 'float' 字段同时输出解析后的数值列 <field>（无法解析时为 None）和原始文本列 <field>_str
+ColumnSpec = namedtuple('ColumnSpec', ['field', 'column', 'default', 'kind'], defaults=('', 'text'))
+# columns: ColumnSpec 列表；derived: {字段: 函数(columns) -> pandas.Series}，在基础列提取完成后计算
+MappingProfile = namedtuple('MappingProfile', ['columns', 'derived'])
+
+
+def _name_en_cn_sku(columns):
+    # product name include en and cn and sku
+    return columns['product_name_en'] + columns['product_name_cn'] + columns['sku']
+
+
+def _grams_to_kg(columns):
+    return columns['weight_grams'].map(lambda grams: None if grams is None else grams / 1000.0)
+
+
+PROFILES = {
+    # 店小秘
+    'dianxiaomi': MappingProfile(
+        columns=[
+            ColumnSpec('sku', 0),
+            ColumnSpec('product_name_cn', 2),
+            ColumnSpec('product_name_en', 3),
+            ColumnSpec('image_url', 6),
+            ColumnSpec('weight', 7, '0.0', 'float'),
+            ColumnSpec('cost_price', 8, '0.0', 'float'),
+            ColumnSpec('product_url_ext', 13),
+            ColumnSpec('decl_name_en_ext', 15),
+            ColumnSpec('decl_name_cn_ext', 16),
+            ColumnSpec('decl_price_ext', 18, '0.0', 'float'),
+        ],
+        derived={'product_name': _name_en_cn_sku},
+    ),
+    # 马帮ERP
+    'mabangerp': MappingProfile(
+        columns=[
+            ColumnSpec('sku', 0),
+            ColumnSpec('product_name_cn', 2),
+            ColumnSpec('product_name_en', 3),
+            ColumnSpec('decl_name_en_ext', 4),
+            ColumnSpec('decl_name_cn_ext', 5),
+            ColumnSpec('decl_price_ext', 6, '0.0', 'float'),
+            ColumnSpec('weight', 7, '0.0', 'float'),
+            ColumnSpec('cost_price', 8, '0.0', 'float'),
+            ColumnSpec('product_url_ext', 11),
+            ColumnSpec('image_url', 12),
+        ],
+        derived={'product_name': _name_en_cn_sku},
+    ),
+    # Shopify 导出的 CSV：按表头名称映射；附加图片行没有 Variant SKU，按空 SKU 跳过。
+    # Shopify 没有中文名称和报关信息，这些字段取默认值
+    'shopify': MappingProfile(
+        columns=[
+            ColumnSpec('sku', 'Variant SKU'),
+            ColumnSpec('product_name_cn', None),
+            ColumnSpec('product_name_en', 'Title'),
+            ColumnSpec('image_url', 'Image Src'),
+            ColumnSpec('weight_grams', 'Variant Grams', '0', 'float'),
+            ColumnSpec('cost_price', 'Cost per item', '0.0', 'float'),
+            ColumnSpec('product_url_ext', None),
+            ColumnSpec('decl_name_en_ext', None),
+            ColumnSpec('decl_name_cn_ext', None),
+            ColumnSpec('decl_price_ext', None, '0.0', 'float'),
+        ],
+        derived={
+            'product_name': _name_en_cn_sku,
+            # Variant Grams 以克为单位，产品重量以千克为单位；原始文本用于错误信息与指纹
+            'weight': _grams_to_kg,
+            'weight_str': lambda columns: columns['weight_grams_str'],
+        },
+    ),
+}
+
+
+# 整数被读成浮点数后产生的 '.0' 后缀，例如 '123.0'
+_INTEGER_FLOAT_RE = r'^(\d+)\.0$'
+
+
+def normalize_series(series, default=''):
+    """ 按列规范化单元格：空值→default，去除首尾空白，去掉整数的 '.0' 后缀，空字符串→default """
+    missing = series.isna()
+    text = series.where(~missing, '').astype(str).str.strip()
+    text = text.str.replace(_INTEGER_FLOAT_RE, r'\1', regex=True)
+    return text.mask(text == '', default)
+
+
+def parse_numeric(text):
+    """ 按列解析数值，返回 (数值列, 无效掩码)。无效的单元格在数值列中为 NaN """
+    numbers = pd.to_numeric(text, errors='coerce')
+    return numbers, numbers.isna().to_numpy()
+
+
+class CompiledProfile:
+    """ 针对某个文件表头编译好的映射：列位置在编译时确定，提取时按列批量处理整个分块 """
+
+    def __init__(self, profile, header=None):
+        header_index = {str(name).strip(): idx for idx, name in enumerate(header or ()) if name is not None}
+        self.columns = []
+        for spec in profile.columns:
+            index = spec.column
+            if isinstance(index, str):
+                if index not in header_index:
+                    raise ValueError(f"Column '{index}' not found in the file header.")
+                index = header_index[index]
+            self.columns.append((spec, index))
+        self.derived = profile.derived
+
+    def extract(self, chunk):
+        """ 将 ``(excel_row_num, values)`` 分块转换为 ``(excel_row_num, vals)`` 列表，vals 为 字段→值 的字典。
+
+        规范化与数值解析都在整列上用 pandas 完成；无法解析的数值单元格在 vals 中为 None，
+        对应的原始文本保留在 ``<field>_str`` 中，用于生成错误信息。
+        """
+        # dtype=object 保留单元格的原始类型；否则有空单元格的整数列会变成 float64，长 SKU 变成科学计数法
+        frame = pd.DataFrame([values for _excel_row_num, values in chunk], dtype=object)
+        empty = pd.Series([None] * len(frame), index=frame.index, dtype=object)
+        columns = {}
+        for spec, index in self.columns:
+            raw = frame[index] if index is not None and index in frame.columns else empty
+            text = normalize_series(raw.astype(object), spec.default)
+            if spec.kind == 'float':
+                numbers, invalid = parse_numeric(text)
+                columns[spec.field + '_str'] = text
+                columns[spec.field] = pd.Series(np.where(invalid, None, numbers.to_numpy(dtype=object)), index=frame.index)
+            else:
+                columns[spec.field] = text
+        for field, compute in self.derived.items():
+            columns[field] = compute(columns)
+
+        names = list(columns)
+        values_by_row = zip(*(columns[name].tolist() for name in names))
+        return [
+            (excel_row_num, dict(zip(names, values)))
+            for (excel_row_num, _values), values in zip(chunk, values_by_row)
+        ]
+
+    def merge_first_non_empty(self, vals_list):
+        """ 合并同一 SKU 的多行 ``extract`` 结果：每个字段取按行顺序第一个非空的值，派生字段按合并后的值重新计算。
+        等于列默认值（例如空白数值单元格规范化后的 '0.0'）的值视为空；数值字段的解析值与原始文本一起取自同一行 """
+        merged = dict(vals_list[-1])
+        for spec, _index in self.columns:
+            keys = (spec.field, spec.field + '_str') if spec.kind == 'float' else (spec.field,)
+            text_key = keys[-1]
+            for vals in vals_list:
+                if vals[text_key] != spec.default:
+                    merged.update({key: vals[key] for key in keys})
+                    break
+        columns = {field: pd.Series([value]) for field, value in merged.items()}
+        for field, compute in self.derived.items():
+            merged[field] = compute(columns).iloc[0]
+        return merged
+
+
+def compile_profile(platform, header=None):
+    if platform not in PROFILES:
+        raise ValueError(f"No column mapping profile for platform '{platform}'.")
+    return CompiledProfile(PROFILES[platform], header)
@@ -0,0 +1,194 @@
+import heapq
+import itertools
+import os
+import resource
+import threading
+import time
+from contextlib import contextmanager, nullcontext
+
+_local = threading.local()
+
+
+def _thread_query_stats():
+    """ Odoo 的游标在当前线程设置了 query_count / query_time 属性时会累加每条 SQL 的次数与耗时 """
+    current_thread = threading.current_thread()
+    if not hasattr(current_thread, 'query_count'):
+        current_thread.query_count = 0
+        current_thread.query_time = 0
+    return current_thread.query_count, current_thread.query_time
+
+
+def _phase_stack():
+    # 阶段栈按线程共享（不区分 profiler），嵌套在其它 profiler 阶段中的耗时同样会从外层阶段扣除
+    if not hasattr(_local, 'stack'):
+        _local.stack = []
+    return _local.stack
+
+
+def peak_rss_kb():
+    """ 当前进程整个生命周期内的峰值常驻内存（KB） """
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+
+
+def current_rss_kb():
+    """ 当前进程此刻的常驻内存（KB），读取 /proc/self/statm；不支持的系统上返回 0 """
+    try:
+        with open('/proc/self/statm') as statm:
+            resident_pages = int(statm.read().split()[1])
+    except (OSError, ValueError, IndexError):
+        return 0
+    return resident_pages * os.sysconf('SC_PAGE_SIZE') // 1024
+
+
+class PhaseProfiler:
+    """ 按阶段累计墙钟时间、SQL 次数、SQL 耗时与处理行数。
+
+    阶段可以嵌套，每个阶段只计算自身耗时（不含嵌套的子阶段），所以各阶段之和等于总耗时。
+    同一个 profiler 可以在多个线程中使用（例如并行的分区任务）。
+    ``parent`` 为外层 profiler（例如基准测试），记录的数据会同时累加到 parent。
+    ``slow_item_limit`` 大于 0 时用 item() 记录耗时最长的前 N 项（例如最慢的行）。
+    每个阶段结束时采样一次常驻内存，memory_growth_kb() 为创建 profiler 以来的峰值增长。
+    """
+
+    def __init__(self, parent=None, slow_item_limit=0):
+        self.parent = parent
+        self.slow_item_limit = slow_item_limit
+        self.phases = {}
+        self._slow_items = []
+        self._counter = itertools.count()
+        self._lock = threading.Lock()
+        self.rss_start_kb = self.rss_peak_kb = current_rss_kb()
+
+    def sample_memory(self):
+        rss_kb = current_rss_kb()
+        with self._lock:
+            self.rss_peak_kb = max(self.rss_peak_kb, rss_kb)
+
+    def memory_growth_kb(self):
+        """ 创建 profiler 以来采样到的常驻内存峰值减去创建时的常驻内存（KB） """
+        with self._lock:
+            return max(0, self.rss_peak_kb - self.rss_start_kb)
+
+    @contextmanager
+    def phase(self, name):
+        """ 记录一个阶段。yield 的字典中可以设置 'rows'，即该阶段处理的行数 """
+        stack = _phase_stack()
+        query_count, query_time = _thread_query_stats()
+        info = {'rows': 0}
+        # [开始时间, 开始时的 SQL 次数, 开始时的 SQL 耗时, 子阶段耗时, 子阶段 SQL 次数, 子阶段 SQL 耗时]
+        frame = [time.perf_counter(), query_count, query_time, 0.0, 0, 0.0]
+        stack.append(frame)
+        try:
+            yield info
+        finally:
+            stack.pop()
+            query_count, query_time = _thread_query_stats()
+            elapsed = time.perf_counter() - frame[0]
+            queries = query_count - frame[1]
+            sql_time = query_time - frame[2]
+            if stack:
+                parent = stack[-1]
+                parent[3] += elapsed
+                parent[4] += queries
+                parent[5] += sql_time
+            self.add(name, elapsed - frame[3], queries - frame[4], sql_time - frame[5], rows=info['rows'])
+            self.sample_memory()
+
+    def add(self, name, seconds, queries=0, sql_seconds=0.0, calls=1, rows=0):
+        with self._lock:
+            entry = self.phases.setdefault(name, {'seconds': 0.0, 'queries': 0, 'sql_seconds': 0.0, 'calls': 0, 'rows': 0})
+            entry['seconds'] += seconds
+            entry['queries'] += queries
+            entry['sql_seconds'] += sql_seconds
+            entry['calls'] += calls
+            entry['rows'] += rows
+        if self.parent:
+            self.parent.add(name, seconds, queries, sql_seconds, calls, rows)
+
+    def merge(self, phases):
+        """ 合并 as_dict() 格式的阶段数据（例如之前运行保存的数据），不累加到 parent """
+        with self._lock:
+            for name, entry in phases.items():
+                current = self.phases.setdefault(name, {'seconds': 0.0, 'queries': 0, 'sql_seconds': 0.0, 'calls': 0, 'rows': 0})
+                for key in current:
+                    current[key] += entry.get(key, 0)
+
+    def as_dict(self):
+        with self._lock:
+            return {name: dict(entry) for name, entry in self.phases.items()}
+
+    @contextmanager
+    def item(self, **info):
+        """ 计时一项工作（例如一行），只保留耗时最长的 slow_item_limit 项 """
+        if not self.slow_item_limit:
+            yield
+            return
+        start = time.perf_counter()
+        query_count = _thread_query_stats()[0]
+        try:
+            yield
+        finally:
+            self.add_slow_item(dict(info, seconds=time.perf_counter() - start, queries=_thread_query_stats()[0] - query_count))
+
+    def add_slow_item(self, item):
+        with self._lock:
+            entry = (item['seconds'], next(self._counter), item)
+            if len(self._slow_items) < self.slow_item_limit:
+                heapq.heappush(self._slow_items, entry)
+            elif entry[0] > self._slow_items[0][0]:
+                heapq.heapreplace(self._slow_items, entry)
+
+    def slowest(self):
+        """ 耗时最长的项，按耗时从长到短排列 """
+        with self._lock:
+            return [item for _seconds, _index, item in sorted(self._slow_items, key=lambda entry: entry[0], reverse=True)]
+
+
+# 导入各阶段的显示顺序，其余阶段按名称排在后面
+PHASE_ORDER = ('prepare', 'index', 'read', 'parse', 'lookup', 'write', 'commit')
+
+
+def format_report(phases, slow_items=()):
+    """ 将 as_dict() 的阶段数据与最慢项格式化为文本表格，用于在表单中显示 """
+    if not phases:
+        return ''
+    total = sum(entry['seconds'] for entry in phases.values()) or 1.0
+    names = [name for name in PHASE_ORDER if name in phases] + sorted(set(phases) - set(PHASE_ORDER))
+    lines = [f"{'Phase':<10}{'Time (s)':>10}{'Share':>8}{'Queries':>10}{'SQL (s)':>10}{'Rows':>10}{'Rows/s':>10}"]
+    for name in names:
+        entry = phases[name]
+        rows = entry.get('rows', 0)
+        rate = f"{rows / entry['seconds']:.0f}" if rows and entry['seconds'] else ''
+        lines.append(f"{name:<10}{entry['seconds']:>10.2f}{entry['seconds'] * 100 / total:>7.1f}%"
+                     f"{entry['queries']:>10}{entry.get('sql_seconds', 0.0):>10.2f}{rows or '':>10}{rate:>10}")
+    if slow_items:
+        lines += ['', 'Slowest rows:']
+        lines += [f"Row {item['excel_row']} (SKU: {item['sku']}): {item['seconds']:.3f}s, {item['queries']} queries" for item in slow_items]
+    return '\n'.join(lines)
+
+
+@contextmanager
+def activate(profiler):
+    """ 在当前线程启用 profiler，之后 phase() 的计时都会记录到该 profiler """
+    previous = getattr(_local, 'profiler', None)
+    _local.profiler = profiler
+    try:
+        yield profiler
+    finally:
+        _local.profiler = previous
+
+
+def current():
+    return getattr(_local, 'profiler', None)
+
+
+def phase(name):
+    """ 在当前线程启用的 profiler 上记录一个阶段；没有启用 profiler 时不做任何事 """
+    profiler = current()
+    return profiler.phase(name) if profiler else nullcontext({'rows': 0})
+
+
+def item(**info):
+    """ 在当前线程启用的 profiler 上计时一项工作（见 PhaseProfiler.item） """
+    profiler = current()
+    return profiler.item(**info) if profiler else nullcontext()
@@ -0,0 +1,165 @@
+import csv
+import io
+import itertools
+import logging
+
+_logger = logging.getLogger(__name__)
+
+# 文件头魔数，用于在文件名不可靠时判断格式
+XLSX_MAGIC = b'PK\x03\x04'
+XLS_MAGIC = b'\xd0\xcf\x11\xe0'
+
+
+# 以下函数的 source 可以是文件路径（例如 filestore 中的附件文件，按需从磁盘读取），
+# 也可以是内存中的 bytes（例如存放在数据库中的附件），两种情况都不会生成临时文件
+
+
+def _is_path(source):
+    return isinstance(source, str)
+
+
+def _xlsx_file(source):
+    """ openpyxl 可以直接打开路径（由它负责关闭），bytes 由 BytesIO 直接引用，不会复制 """
+    return source if _is_path(source) else io.BytesIO(source)
+
+
+def _open_text(source):
+    binary = open(source, 'rb') if _is_path(source) else io.BytesIO(source)
+    return io.TextIOWrapper(binary, encoding='utf-8-sig', newline='')
+
+
+def _open_xls(source):
+    import xlrd
+    # xlrd 打开路径时会对文件做内存映射
+    if _is_path(source):
+        return xlrd.open_workbook(source, on_demand=True)
+    return xlrd.open_workbook(file_contents=source, on_demand=True)
+
+
+def detect_format(source):
+    """ 根据文件头判断表格格式：'xlsx'、'xls' 或 'csv' """
+    if _is_path(source):
+        with open(source, 'rb') as f:
+            head = f.read(8)
+    else:
+        head = bytes(source[:8])
+    if head.startswith(XLSX_MAGIC):
+        return 'xlsx'
+    if head.startswith(XLS_MAGIC):
+        return 'xls'
+    return 'csv'
+
+
+def _iter_xlsx_rows(source):
+    import openpyxl
+    # read_only 模式按需解析 sheet XML，不会把整个工作簿载入内存
+    workbook = openpyxl.load_workbook(_xlsx_file(source), read_only=True, data_only=True)
+    try:
+        sheet = workbook.active
+        header = next(sheet.iter_rows(max_row=1, values_only=True), ())
+        _logger.info(f"Excel columns found: {list(header)}")
+        for row in sheet.iter_rows(min_row=2, values_only=True):
+            yield list(row)
+    finally:
+        workbook.close()
+
+
+def _iter_xls_rows(source):
+    workbook = _open_xls(source)
+    try:
+        sheet = workbook.sheet_by_index(0)
+        if sheet.nrows:
+            _logger.info(f"Excel columns found: {sheet.row_values(0)}")
+        for row_idx in range(1, sheet.nrows):
+            yield sheet.row_values(row_idx)
+    finally:
+        workbook.release_resources()
+
+
+def _iter_csv_rows(source):
+    with _open_text(source) as csvfile:
+        reader = csv.reader(csvfile)
+        header = next(reader, None)
+        _logger.info(f"CSV columns found: {header}")
+        for row in reader:
+            yield row
+
+
+def estimate_row_count(source, file_format=None):
+    """ 估算数据行数（不含表头），用于显示进度。xlsx 使用 sheet 的 dimension 信息，不需要遍历全部行；
+    没有 dimension 信息（或只有 A1）的 xlsx 返回 0，准确的行数由导入任务的预扫描得出 """
+    file_format = file_format or detect_format(source)
+    if file_format == 'xlsx':
+        import openpyxl
+        workbook = openpyxl.load_workbook(_xlsx_file(source), read_only=True)
+        try:
+            max_row = workbook.active.max_row
+        finally:
+            workbook.close()
+        return max(max_row - 1, 0) if max_row else 0
+    if file_format == 'xls':
+        workbook = _open_xls(source)
+        try:
+            return max(workbook.sheet_by_index(0).nrows - 1, 0)
+        finally:
+            workbook.release_resources()
+    if not _is_path(source):
+        return max(source.count(b'\n') - 1, 0)
+    with open(source, 'rb') as f:
+        return max(sum(1 for _line in f) - 1, 0)
+
+
+def read_header(source, file_format=None):
+    """ 返回表头行（第 1 行）的单元格值列表 """
+    file_format = file_format or detect_format(source)
+    if file_format == 'xlsx':
+        import openpyxl
+        workbook = openpyxl.load_workbook(_xlsx_file(source), read_only=True, data_only=True)
+        try:
+            return list(next(workbook.active.iter_rows(max_row=1, values_only=True), ()))
+        finally:
+            workbook.close()
+    if file_format == 'xls':
+        workbook = _open_xls(source)
+        try:
+            sheet = workbook.sheet_by_index(0)
+            return sheet.row_values(0) if sheet.nrows else []
+        finally:
+            workbook.release_resources()
+    with _open_text(source) as csvfile:
+        return next(csv.reader(csvfile), [])
+
+
+ROW_ITERATORS = {
+    'xlsx': _iter_xlsx_rows,
+    'xls': _iter_xls_rows,
+    'csv': _iter_csv_rows,
+}
+
+
+def _is_blank(values):
+    return all(value is None or (isinstance(value, str) and not value.strip()) for value in values)
+
+
+def iter_row_chunks(source, chunk_size=500, file_format=None, start_row=2):
+    """ 以固定大小的分块流式读取表格的数据行。
+
+    每个分块是 ``(excel_row_num, values)`` 元组的列表，行号与 Excel 中显示的一致
+    （表头为第 1 行）。行号小于 ``start_row`` 的行会被跳过（用于断点续传），
+    完全空白的行不会输出。
+    任意时刻内存中最多只保留一个分块。``chunk_size`` 也可以是每次读取分块前调用的函数，
+    用于在导入过程中动态调整分块大小。
+    """
+    file_format = file_format or detect_format(source)
+    rows = ROW_ITERATORS[file_format](source)
+    numbered = (
+        (excel_row_num, values)
+        for excel_row_num, values in enumerate(rows, 2)
+        if excel_row_num >= start_row and not _is_blank(values)
+    )
+    while True:
+        size = chunk_size() if callable(chunk_size) else chunk_size
+        chunk = list(itertools.islice(numbered, size))
+        if not chunk:
+            return
+        yield chunk
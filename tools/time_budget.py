@@ -0,0 +1,33 @@
+# 距离 worker 时间限制预留的安全余量：限制的比例，且不少于若干秒，保证最后一个分块与提交在限制之前完成
+SAFETY_RATIO = 0.25
+MIN_SAFETY_MARGIN = 15
+# 时间限制很小时仍保留的最短预算（秒）
+MIN_TIME_BUDGET = 10
+
+
+def _usable(limit):
+    return limit - max(MIN_SAFETY_MARGIN, limit * SAFETY_RATIO)
+
+
+def cron_time_budget(requested, options, reserve=0):
+    """ 按 Odoo 的 worker 时间限制收紧 cron 的时间预算（秒）。
+
+    ``options`` 为 ``odoo.tools.config``。prefork 模式（workers > 0）下，cron worker 的真实运行时间超过
+    ``limit_time_real_cron``（为 -1 时沿用 ``limit_time_real``）或 CPU 时间超过 ``limit_time_cpu`` 时会被杀掉，
+    0 表示不限制。多线程模式没有这些限制，直接返回 ``requested``。
+
+    ``reserve`` 为预算用完之后最后一步仍可能占用的真实时间（例如正在进行的下载的超时），从真实时间限制中扣除。
+    """
+    if not options.get('workers'):
+        return requested
+    budgets = [requested]
+    limit_real = options.get('limit_time_real_cron', -1)
+    if limit_real is None or limit_real < 0:
+        limit_real = options.get('limit_time_real', 0)
+    if limit_real and limit_real > 0:
+        budgets.append(_usable(limit_real) - reserve)
+    limit_cpu = options.get('limit_time_cpu', 0)
+    if limit_cpu and limit_cpu > 0:
+        budgets.append(_usable(limit_cpu))
+    budget = min(budgets)
+    return budget if budget == requested else max(MIN_TIME_BUDGET, budget)